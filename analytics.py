@@ -0,0 +1,148 @@
+# Аналитика по бронированиям: выручка по жилью, занятые ночи по городам, загрузка по месяцам
+from array import array
+from datetime import date
+from classes import Housing, Booking
+from classes.locking import store_lock
+from records import materialize_all
+
+try:
+    import numpy as np
+except ImportError:  # numpy не обязателен: без него отчеты считаются эталонной реализацией
+    np = None
+
+
+class BookingArrays:
+    """
+    Выгрузка хранилищ в параллельные массивы (по одной строке на бронирование):
+      start, end — порядковые номера дат (date.toordinal), строки дат не разбираются;
+      housing    — номер жилья в housing_ids;
+    и справочники по жилью: housing_ids, price (цена за ночь), city (код города в cities).
+    При наличии numpy массивы — ndarray, иначе array.array.
+    """
+
+    def __init__(self, start, end, housing, housing_ids, price, city, cities):
+        self.start = start
+        self.end = end
+        self.housing = housing
+        self.housing_ids = housing_ids
+        self.price = price
+        self.city = city
+        self.cities = cities
+
+    def __len__(self):
+        return len(self.start)
+
+
+def export() -> BookingArrays:
+    """Выгружает текущее состояние бронирований и жилья в BookingArrays."""
+    housing_ids, price, city = array('q'), array('d'), array('l')
+    start, end, housing = array('l'), array('l'), array('l')
+    row_of, city_codes = {}, {}
+    with store_lock.read_after(materialize_all):
+        for h in Housing.get_all():
+            row_of[h.housing_id] = len(housing_ids)
+            housing_ids.append(h.housing_id)
+            price.append(h.price_per_night)
+            city.append(city_codes.setdefault(h.location.city, len(city_codes)))
+        for b in Booking.get_all():
+            s, e = b._span
+            start.append(s)
+            end.append(e)
+            housing.append(row_of[b.housing_id])
+    columns = [start, end, housing, housing_ids, price, city]
+    if np is not None:
+        columns = [np.frombuffer(c, dtype=c.typecode) if len(c) else np.array([], dtype=c.typecode) for c in columns]
+    return BookingArrays(*columns, list(city_codes))
+
+
+def _month_start(ordinal: int) -> int:
+    d = date.fromordinal(ordinal)
+    return date(d.year, d.month, 1).toordinal()
+
+
+def _next_month(ordinal: int) -> int:
+    d = date.fromordinal(ordinal)
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1).toordinal()
+
+
+def _months(first: int, last: int) -> list:
+    """Порядковые номера первых дней месяцев от месяца first до месяца, следующего за last."""
+    bounds = [_month_start(first)]
+    while bounds[-1] <= last:
+        bounds.append(_next_month(bounds[-1]))
+    return bounds
+
+
+def _month_key(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime("%Y-%m")
+
+
+def revenue_by_housing(data: BookingArrays = None, reference: bool = False) -> dict:
+    """Возвращает {housing_id: выручка} — сумму ночей бронирований, умноженную на цену за ночь."""
+    data = export() if data is None else data
+    if np is None or reference:
+        revenue = [0.0] * len(data.housing_ids)
+        for s, e, h in zip(data.start, data.end, data.housing):
+            revenue[h] += (e - s) * data.price[h]
+    else:
+        nights = np.bincount(data.housing, weights=data.end - data.start, minlength=len(data.housing_ids))
+        revenue = (nights * data.price).tolist()
+    return dict(zip(data.housing_ids, revenue))
+
+
+def nights_by_city(data: BookingArrays = None, reference: bool = False) -> dict:
+    """Возвращает {город: число забронированных ночей}."""
+    data = export() if data is None else data
+    if np is None or reference:
+        nights = [0] * len(data.cities)
+        for s, e, h in zip(data.start, data.end, data.housing):
+            nights[data.city[h]] += e - s
+    else:
+        nights = np.bincount(data.city[data.housing], weights=data.end - data.start,
+                             minlength=len(data.cities)).astype(np.int64).tolist()
+    return dict(zip(data.cities, nights))
+
+
+def occupancy_by_month(data: BookingArrays = None, reference: bool = False) -> dict:
+    """
+    Возвращает {'ГГГГ-ММ': загрузка} — долю занятых ночей месяца от числа всех ночей
+    всего жилья в этом месяце. Ночь относится к месяцу, в котором она начинается,
+    поэтому бронирование через границу месяцев делится между ними.
+    """
+    data = export() if data is None else data
+    if not len(data) or not len(data.housing_ids):
+        return {}
+    if np is None or reference:
+        first, last = min(data.start), max(data.end)
+        bounds = _months(first, last)
+        nights = [0] * (len(bounds) - 1)
+        for s, e in zip(data.start, data.end):
+            m = 0
+            while bounds[m + 1] <= s:
+                m += 1
+            while s < e:
+                upto = min(e, bounds[m + 1])
+                nights[m] += upto - s
+                s, m = upto, m + 1
+    else:
+        first, last = int(data.start.min()), int(data.end.max())
+        bounds = _months(first, last)
+        # Число занятых ночей по дням: +1 в день заезда, -1 в день выезда, затем накопленная сумма
+        base = bounds[0]
+        diff = np.bincount(data.start - base, minlength=bounds[-1] - base + 1)
+        diff -= np.bincount(data.end - base, minlength=bounds[-1] - base + 1)
+        per_day = np.cumsum(diff)[:-1]
+        nights = np.add.reduceat(per_day, np.asarray(bounds[:-1]) - base).tolist()
+    capacity = len(data.housing_ids)
+    return {_month_key(b): n / (capacity * (bounds[m + 1] - b))
+            for m, (b, n) in enumerate(zip(bounds, nights)) if n}
+
+
+def check(data: BookingArrays = None) -> bool:
+    """Сверяет результаты векторизованных отчетов с эталонной реализацией на Python."""
+    data = export() if data is None else data
+    for report in (revenue_by_housing, nights_by_city, occupancy_by_month):
+        fast, slow = report(data), report(data, reference=True)
+        if fast.keys() != slow.keys() or any(abs(fast[k] - slow[k]) > 1e-9 * max(1.0, abs(slow[k])) for k in slow):
+            return False
+    return True
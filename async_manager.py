@@ -0,0 +1,146 @@
+# Асинхронный интерфейс к Manager для приложений на asyncio: цикл событий не блокируется
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+from classes.locking import store_lock
+from manager import Manager, SaveCancelled
+import metrics
+import snapshot
+
+
+def _load_worker(method: str, filename: str, kwargs: dict, snap_path: str, conn):
+    """
+    Выполняется в отдельном процессе: загружает файл обычным методом Manager (со всеми
+    проверками) и сохраняет результат в бинарный снимок snap_path. Отправляет в conn
+    пару (сообщения Manager, исключение или None).
+    """
+    events = []
+    metrics.set_sink(events.append)
+    try:
+        getattr(Manager, method)(filename, **kwargs)
+        if events and events[-1]['ok']:
+            snapshot.save_snapshot(snap_path)
+        conn.send((events, None))
+    except Exception as e:
+        conn.send((events, e))
+    finally:
+        conn.close()
+
+
+class AsyncManager:
+    """
+    Асинхронные версии методов Manager.
+    Загрузка выполняется в отдельном процессе: файл разбирается и проверяется там, результат
+    передается через временный бинарный снимок и подключается одним шагом под блокировкой
+    записи (см. snapshot.load_snapshot). До этого момента читатели видят прежнее состояние,
+    после — новое целиком; объекты нового состояния создаются лениво при обращении.
+    Сохранение выполняется в пуле потоков, файл пишется блоками и подменяется целиком.
+    Отмена задачи (task.cancel()) прерывает загрузку, завершая процесс или не подключая
+    снимок, пока подключение ждет блокировку, а сохранение — на границе очередного блока;
+    в обоих случаях состояние и файл остаются прежними. Само подключение снимка (одна
+    подмена хранилищ) не прерывается: отмена, пришедшая во время него, оставляет новое состояние.
+    Процесс загрузки запускается методом spawn, поэтому запуск программы должен быть
+    защищен условием if __name__ == '__main__'.
+    """
+
+    @staticmethod
+    async def save_to_json(filename: str):
+        """Асинхронный Manager.save_to_json."""
+        await AsyncManager._save(Manager.save_to_json, filename)
+
+    @staticmethod
+    async def save_to_xml(filename: str, indent: str = "    "):
+        """Асинхронный Manager.save_to_xml."""
+        await AsyncManager._save(Manager.save_to_xml, filename, indent)
+
+    @staticmethod
+    async def _save(method, filename: str, *args):
+        loop = asyncio.get_running_loop()
+        cancel = threading.Event()
+        future = loop.run_in_executor(None, lambda: method(filename, *args, cancel=cancel))
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancel.set()
+            try:
+                await future  # Дожидаемся удаления временного файла
+            except SaveCancelled:
+                pass
+            raise
+
+    @staticmethod
+    async def load_from_json(filename: str, stream: bool = False, materialize: bool = False):
+        """
+        Асинхронный Manager.load_from_json. При materialize=True после подключения
+        все объекты догружаются в пуле потоков.
+        """
+        await AsyncManager._load('load_from_json', filename, {'stream': stream}, materialize)
+
+    @staticmethod
+    async def load_from_xml(filename: str, materialize: bool = False):
+        """Асинхронный Manager.load_from_xml (см. load_from_json)."""
+        await AsyncManager._load('load_from_xml', filename, {}, materialize)
+
+    @staticmethod
+    async def _load(method: str, filename: str, kwargs: dict, materialize: bool):
+        loop = asyncio.get_running_loop()
+        fd, snap_path = tempfile.mkstemp(suffix=".snap")
+        os.close(fd)
+        # spawn, а не fork: дочерний процесс не должен унаследовать занятые блокировки
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_load_worker, args=(method, filename, kwargs, snap_path, sender), daemon=True)
+        events, error = [], None
+        try:
+            process.start()
+            sender.close()
+            try:
+                events, error = await loop.run_in_executor(None, receiver.recv)
+            except EOFError:
+                events, error = [], RuntimeError(f"Процесс загрузки {filename} завершился аварийно.")
+            except asyncio.CancelledError:
+                process.terminate()  # До join: иначе отмена ждала бы окончания всей загрузки
+                raise
+            finally:
+                await loop.run_in_executor(None, process.join)
+        except asyncio.CancelledError:
+            process.terminate()
+            process.join()
+            raise
+        finally:
+            receiver.close()
+            if error is not None or not (events and events[-1]['ok']):
+                os.remove(snap_path)
+
+        for event in events:
+            fields = {k: v for k, v in event.items() if k not in ('time', 'event', 'message', 'ok')}
+            metrics.log(event['event'], event['message'], event['ok'], **fields)
+        if error is not None:
+            raise error
+        if not events[-1]['ok']:
+            return
+
+        # Подмена состояния ждет блокировку записи (ее может держать сохранение), поэтому
+        # тоже выполняется в пуле потоков
+        cancel = threading.Event()
+        future = loop.run_in_executor(None, AsyncManager._publish, snap_path, cancel)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancel.set()
+            await future  # Снимок либо не подключен, либо подключение уже завершилось
+            raise
+        finally:
+            os.remove(snap_path)  # Отображение в память остается доступным до закрытия снимка
+        if materialize or Manager._tracker is not None or Manager._journal is not None:
+            await loop.run_in_executor(None, Manager._after_snapshot)
+
+    @staticmethod
+    def _publish(snap_path: str, cancel: threading.Event):
+        """Подключает снимок под блокировкой записи, если загрузку не отменили, пока она ждала блокировку."""
+        with store_lock.write():
+            if not cancel.is_set():
+                snapshot.load_snapshot(snap_path)
+
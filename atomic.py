@@ -0,0 +1,36 @@
+# Атомарная запись файлов: временный файл рядом с целевым подменяет его через os.replace
+import os
+import stat
+import tempfile
+
+
+def _read_umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _read_umask()  # Читается один раз при импорте: os.umask меняет маску всего процесса
+
+
+def temp_file(filename: str):
+    """
+    Создает временный файл в каталоге filename и возвращает (fd, путь). У каждого вызова
+    свой файл, поэтому одновременные сохранения в один файл не мешают друг другу.
+    """
+    return tempfile.mkstemp(prefix=os.path.basename(filename) + ".", suffix=".tmp",
+                            dir=os.path.dirname(filename) or ".")
+
+
+def replace(tmp: str, filename: str):
+    """
+    Подменяет filename временным файлом tmp. mkstemp создает файл с правами 0600, поэтому
+    tmp сначала получает права прежнего filename, а для нового файла — права, которые дал бы
+    ему open (0666 с учетом umask).
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp, mode)
+    os.replace(tmp, filename)
@@ -0,0 +1,3 @@
+# Бенчмарки хранилища и Manager: генератор синтетических данных (generate.py),
+# замер времени и памяти основных операций с JSON-отчетом (run.py)
+# и многопоточный стресс-тест с замером пропускной способности (stress.py)
@@ -0,0 +1,140 @@
+# Детерминированный генератор синтетических наборов данных в формате Manager.save_to_json
+#
+# Запуск: python -m benchmarks.generate 1m data-1m.json [--seed 1] [--skew 1.0]
+import argparse
+import bisect
+import itertools
+import json
+import random
+from datetime import date
+
+# Масштаб — число бронирований; пользователей в 10 раз меньше, жилья — в 20, отзывов — в 2
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Города с долей жилья в них
+CITIES = (("Москва", 0.35), ("Санкт-Петербург", 0.2), ("Казань", 0.1), ("Сочи", 0.1),
+          ("Екатеринбург", 0.08), ("Новосибирск", 0.07), ("Калининград", 0.05), ("Владивосток", 0.05))
+STREETS = ("Ленина", "Мира", "Садовая", "Центральная", "Школьная", "Набережная", "Советская",
+           "Гагарина", "Лесная", "Пушкина", "Тверская", "Невский проспект", "Морская", "Зеленая")
+FIRST_NAMES = ("Иван", "Анна", "Олег", "Мария", "Петр", "Елена", "Сергей", "Ольга", "Дмитрий", "Наталья")
+LAST_NAMES = ("Петров", "Смирнова", "Волков", "Иванова", "Козлов", "Попова", "Соколов", "Морозова")
+KINDS = ("Уютная квартира", "Апартаменты", "Студия", "Дом", "Комната", "Лофт")
+COMMENTS = ("Отличное место!", "Все понравилось, вернемся еще.", "Шумно ночью.",
+            "Чисто и удобно, хозяин на связи.", "Фото не соответствуют действительности.", "")
+START = date(2024, 1, 1).toordinal()
+HORIZON = START + 10 * 365  # Календарь жилья заполняется не дальше этой даты
+
+
+def counts(bookings: int) -> dict:
+    """Число объектов каждого класса для набора с указанным числом бронирований."""
+    return {'users': max(bookings // 10, 1), 'housings': max(bookings // 20, 1),
+            'bookings': bookings, 'reviews': bookings // 2}
+
+
+class _Popularity:
+    """
+    Выбор ID от 1 до n с распределением Ципфа: вес ID с номером k пропорционален 1 / k**skew.
+    skew=0 — равномерный выбор, чем больше skew, тем сильнее перекос к популярным объектам.
+    """
+
+    def __init__(self, rng: random.Random, n: int, skew: float):
+        self._rng = rng
+        self._n = n
+        self._cum = None if not skew else list(itertools.accumulate(1 / k ** skew for k in range(1, n + 1)))
+
+    def pick(self) -> int:
+        if self._cum is None:
+            return self._rng.randint(1, self._n)
+        return bisect.bisect_left(self._cum, self._rng.random() * self._cum[-1]) + 1
+
+    def pick_uniform(self) -> int:
+        return self._rng.randint(1, self._n)
+
+
+def iter_users(rng: random.Random, n: int):
+    for user_id in range(1, n + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {'user_id': user_id, 'name': f"{first} {last}", 'contact_info': f"user{user_id}@example.com"}
+
+
+def iter_housings(rng: random.Random, n: int):
+    names, weights = zip(*CITIES)
+    for housing_id in range(1, n + 1):
+        city = rng.choices(names, weights)[0]
+        location = {'city': city, 'street': rng.choice(STREETS), 'building_number': str(rng.randint(1, 150)),
+                    'postal_code': rng.randint(100000, 699999) if rng.random() < 0.8 else None}
+        price = round(rng.lognormvariate(8.3, 0.5), -1) or 10.0
+        yield {'housing_id': housing_id, 'location': location, 'price_per_night': price,
+               'description': f"{rng.choice(KINDS)} в городе {city}"}
+
+
+def iter_bookings(rng: random.Random, n: int, users: _Popularity, housings: _Popularity):
+    """
+    Бронирования без пересечений: каждое жилье бронируется следующим свободным периодом.
+    Если календарь популярного жилья заполнен до HORIZON, выбирается случайное другое.
+    """
+    free_from = {}  # {housing_id: первый свободный день}
+    for booking_id in range(1, n + 1):
+        housing_id = housings.pick()
+        while free_from.get(housing_id, START) > HORIZON:
+            housing_id = housings.pick_uniform()
+        start = free_from.get(housing_id, START) + int(rng.expovariate(0.3))
+        end = start + min(1 + int(rng.expovariate(0.35)), 30)
+        free_from[housing_id] = end
+        yield {'booking_id': booking_id, 'user_id': users.pick(), 'housing_id': housing_id,
+               'start_date': date.fromordinal(start).isoformat(), 'end_date': date.fromordinal(end).isoformat()}
+
+
+def iter_reviews(rng: random.Random, n: int, users: _Popularity, housings: _Popularity):
+    for review_id in range(1, n + 1):
+        yield {'review_id': review_id, 'user_id': users.pick(), 'housing_id': housings.pick(),
+               'rating': rng.choices((1, 2, 3, 4, 5), (5, 5, 15, 35, 40))[0], 'comment': rng.choice(COMMENTS)}
+
+
+def generate(bookings: int, seed: int = 1, skew: float = 1.0):
+    """
+    Отдает пары (раздел, запись) набора данных с указанным числом бронирований.
+    При одинаковых seed и skew результат всегда одинаков. skew задает перекос
+    популярности жилья и пользователей (см. _Popularity).
+    """
+    n = counts(bookings)
+    rng = random.Random(seed)
+    users = _Popularity(rng, n['users'], skew)
+    housings = _Popularity(rng, n['housings'], skew)
+    sections = (('users', iter_users(rng, n['users'])), ('housings', iter_housings(rng, n['housings'])),
+                ('bookings', iter_bookings(rng, n['bookings'], users, housings)),
+                ('reviews', iter_reviews(rng, n['reviews'], users, housings)))
+    for section, records in sections:
+        for rec in records:
+            yield section, rec
+
+
+def write_json(filename: str, bookings: int, seed: int = 1, skew: float = 1.0):
+    """Записывает набор данных в файл формата Manager.save_to_json, не держа его целиком в памяти."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        current = None
+        for section, rec in generate(bookings, seed, skew):
+            if section != current:
+                f.write('{\n' if current is None else '\n    ],\n')
+                f.write(f'    "{section}": [\n        ')
+                current = section
+            else:
+                f.write(',\n        ')
+            f.write(json.dumps(rec, ensure_ascii=False))
+        f.write('\n    ]\n}\n' if current is not None else '{}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических данных для бенчмарков.")
+    parser.add_argument('scale', help=f"масштаб ({', '.join(SCALES)}) или число бронирований")
+    parser.add_argument('output', help="файл JSON для записи")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skew', type=float, default=1.0, help="перекос популярности (0 — равномерно)")
+    args = parser.parse_args()
+    bookings = SCALES.get(args.scale) or int(args.scale)
+    write_json(args.output, bookings, args.seed, args.skew)
+    print(f"✅ Набор данных ({bookings} бронирований) записан в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# Замер времени и пиковой памяти операций хранилища и Manager с машиночитаемым отчетом
+#
+# Запуск: python -m benchmarks.run --scale 100k [--memory] [--storage-memory] [--workers 1,2,4] [--out report.json]
+#         python -m benchmarks.run --compare old.json new.json
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from classes import Address, User, Housing, Booking, Review
+from manager import Manager
+from benchmarks.generate import SCALES, counts, write_json
+
+REPORT_VERSION = 1
+OPERATIONS = ('load_from_json', 'load_json_stream', 'get', 'create', 'save_to_json', 'export_json', 'export_ndjson', 'load_from_ndjson',
+              'save_to_xml', 'load_from_xml', 'save_sharded', 'load_sharded', 'cascade_delete')
+WORKERS = (1, 2, 4)
+
+
+class _Measure:
+    """Замеряет время блока и, если включено, пиковую память через tracemalloc."""
+
+    def __init__(self, memory: bool):
+        self.memory = memory
+        self.seconds = None
+        self.peak_mb = None
+
+    def __enter__(self):
+        gc.collect()
+        if self.memory:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        if self.memory:
+            self.peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+
+
+# Загрузка в отдельном процессе: пиковый RSS процесса только растет, поэтому
+# в общем процессе бенчмарка он показал бы максимум всех предыдущих операций
+_RSS_SCRIPT = """
+import contextlib, io, json, resource, sys, time
+from manager import Manager
+method, filename, kwargs = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+start = time.perf_counter()
+if method:
+    with contextlib.redirect_stdout(io.StringIO()):
+        getattr(Manager, method)(filename, **kwargs)
+seconds = time.perf_counter() - start
+try:  # В Linux ru_maxrss переживает exec и начинается с RSS родителя, а VmHWM — нет
+    with open('/proc/self/status') as f:
+        peak = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:'))
+except OSError:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+print(json.dumps([seconds, peak]))
+"""
+
+
+def _isolated(method: str, filename: str = '', **kwargs) -> tuple:
+    """
+    Выполняет Manager.<method>(filename, **kwargs) в новом процессе и возвращает
+    (секунды, пиковый RSS процесса в МБ). При пустом method замеряется процесс после импортов.
+    На платформах без модуля resource возвращает (None, None).
+    """
+    try:
+        import resource  # noqa: F401 — только POSIX
+    except ImportError:
+        return None, None
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, '-c', _RSS_SCRIPT, method, filename, json.dumps(kwargs)],
+                         capture_output=True, text=True, cwd=root, check=True).stdout
+    seconds, peak = json.loads(out.splitlines()[-1])
+    return seconds, peak / 2 ** 20
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(bookings: int, seed: int = 1, skew: float = 1.0, memory: bool = False, sample: int = 10000,
+        workdir: str = None, workers=WORKERS) -> dict:
+    """
+    Генерирует набор данных с bookings бронированиями и по очереди замеряет операции OPERATIONS:
+    get и create выполняются sample раз, cascade_delete удаляет sample // 10 объектов жилья
+    вместе с их бронированиями и отзывами. load_from_json и load_json_stream (потоковый разбор,
+    stream=True) дополнительно выполняются каждый в отдельном процессе: в отчет входит пиковый
+    RSS процесса (peak_rss_mb) и RSS процесса без загрузки (base_rss_mb). save_sharded и load_sharded замеряются для каждого
+    числа процессов из workers (операции save_sharded.w<N>, load_sharded.w<N>) при одном и том же
+    числе частей max(workers). Для операций записи в отчет входят размер файла и скорость записи
+    в МБ/с. Возвращает отчет.
+    """
+    n = counts(bookings)
+    rng = random.Random(seed)
+    results = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        data_json = os.path.join(tmp, 'data.json')
+        out_json, out_xml = os.path.join(tmp, 'out.json'), os.path.join(tmp, 'out.xml')
+        out_compact, out_ndjson = os.path.join(tmp, 'out.compact.json'), os.path.join(tmp, 'out.ndjson')
+        out_sharded = os.path.join(tmp, 'sharded')
+        write_json(data_json, bookings, seed, skew)
+
+        def measure(name, ops, action, output=None):
+            with _Measure(memory) as m, contextlib.redirect_stdout(io.StringIO()):
+                action()
+            results[name] = {'seconds': round(m.seconds, 6), 'ops': ops,
+                             'ops_per_second': round(ops / m.seconds, 1) if m.seconds else None}
+            line = f"  {name:<18} {m.seconds:9.3f} s"
+            if output is not None:
+                size = os.path.getsize(output) / 2 ** 20
+                results[name]['file_mb'] = round(size, 3)
+                results[name]['mb_per_second'] = round(size / m.seconds, 1) if m.seconds else None
+                line += f"  {size:9.1f} MB файл  {size / m.seconds:7.1f} MB/s"
+            if memory:
+                results[name]['peak_mb'] = round(m.peak_mb, 3)
+                line += f"  {m.peak_mb:9.1f} MB"
+            print(line)
+
+        measure('load_json_stream', sum(n.values()), lambda: Manager.load_from_json(data_json, stream=True))
+        measure('load_from_json', sum(n.values()), lambda: Manager.load_from_json(data_json))
+        base_rss = _isolated('')[1]
+        for name, stream in (('load_from_json', False), ('load_json_stream', True)):
+            seconds, peak = _isolated('load_from_json', data_json, stream=stream)
+            if peak is not None:
+                results[name]['peak_rss_mb'] = round(peak, 1)
+                print(f"  {name:<18} {seconds:9.3f} s  {peak:9.1f} MB пиковый RSS (отдельный процесс)")
+
+        kinds = ((User, n['users']), (Housing, n['housings']), (Booking, n['bookings']), (Review, n['reviews']))
+        lookups = [(cls, rng.randint(1, count)) for cls, count in kinds for _ in range(sample // 4)]
+        measure('get', len(lookups), lambda: [cls.get(item_id) for cls, item_id in lookups])
+
+        def create():
+            user_id, housing_id, booking_id = n['users'] + 1, n['housings'] + 1, n['bookings'] + 1
+            for i in range(sample // 3):
+                user = User.create(user_id + i, f"Новый {i}", f"new{i}@example.com")
+                housing = Housing.create(housing_id + i, Address("Москва", "Новая", str(i % 100 + 1)), 2500.0, "Новое жилье")
+                Booking.create(booking_id + i, user, housing, "2030-01-01", "2030-01-05")
+        measure('create', sample // 3 * 3, create)
+
+        measure('save_to_json', sum(n.values()), lambda: Manager.save_to_json(out_json), out_json)
+        measure('export_json', sum(n.values()), lambda: Manager.export_json(out_compact), out_compact)
+        measure('export_ndjson', sum(n.values()), lambda: Manager.export_json(out_ndjson, 'ndjson'), out_ndjson)
+        measure('load_from_ndjson', sum(n.values()), lambda: Manager.load_from_ndjson(out_ndjson))
+        measure('save_to_xml', sum(n.values()), lambda: Manager.save_to_xml(out_xml), out_xml)
+        measure('load_from_xml', sum(n.values()), lambda: Manager.load_from_xml(out_xml))
+        for w in workers:
+            measure(f'save_sharded.w{w}', sum(n.values()), lambda: Manager.save_sharded(out_sharded, max(workers), w))
+            measure(f'load_sharded.w{w}', sum(n.values()), lambda: Manager.load_sharded(out_sharded, w))
+
+        victims = [Housing.get(housing_id) for housing_id in rng.sample(range(1, n['housings'] + 1), min(sample // 10, n['housings']))]
+        measure('cascade_delete', len(victims), lambda: [h.delete() for h in victims])
+
+    return {'version': REPORT_VERSION, 'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+            'bookings': bookings, 'counts': n, 'seed': seed, 'skew': skew, 'memory': memory,
+            'base_rss_mb': None if base_rss is None else round(base_rss, 1), 'results': results}
+
+
+def storage_memory(bookings: int, seed: int = 1, skew: float = 1.0, cache_size: int = 10_000,
+                   workdir: str = None) -> dict:
+    """
+    Память, которую занимают хранилища набора с bookings бронированиями: в словарях объектов
+    (по умолчанию) и в колоночном хранилище (Manager.open_columnar_storage с кешем на cache_size
+    объектов каждого класса). Считаются живые выделения tracemalloc после загрузки и после
+    переключения; в отчет входят МБ всего и МБ на миллион строк (объектов всех классов).
+    """
+    n = counts(bookings)
+    rows = sum(n.values())
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        data_json = os.path.join(tmp, 'data.json')
+        write_json(data_json, bookings, seed, skew)
+        with contextlib.redirect_stdout(io.StringIO()):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                Manager.load_from_json(data_json)
+                gc.collect()
+                used = {'dict': tracemalloc.get_traced_memory()[0]}
+                Manager.open_columnar_storage(cache_size)
+                gc.collect()
+                used['columnar'] = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            Manager.close_storage()
+    report = {'rows': rows, 'cache_size': cache_size}
+    for mode, size in used.items():
+        report[mode] = {'mb': round(size / 2 ** 20, 3), 'mb_per_million_rows': round(size / 2 ** 20 / rows * 1e6, 1)}
+        print(f"  {mode:<16} {report[mode]['mb']:9.1f} MB  {report[mode]['mb_per_million_rows']:9.1f} MB на 1 млн строк")
+    return report
+
+
+def compare(old: dict, new: dict) -> dict:
+    """
+    Сравнивает два отчета: {операция: отношение времени new/old} (больше 1 — замедление).
+    Сравниваются операции, замеренные в обоих отчетах, включая точки перебора workers.
+    """
+    return {name: round(new['results'][name]['seconds'] / old['results'][name]['seconds'], 3)
+            for name in new['results'] if name in old['results'] and old['results'][name]['seconds']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки хранилища и Manager.")
+    parser.add_argument('--scale', default='10k', help=f"масштаб ({', '.join(SCALES)}) или число бронирований")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skew', type=float, default=1.0)
+    parser.add_argument('--sample', type=int, default=10000, help="число операций get/create")
+    parser.add_argument('--memory', action='store_true', help="замерять пиковую память (tracemalloc замедляет операции)")
+    parser.add_argument('--storage-memory', action='store_true',
+                        help="сравнить память хранилищ в словарях и в колоночном режиме")
+    parser.add_argument('--out', help="файл JSON-отчета (по умолчанию bench-<масштаб>-<коммит>.json)")
+    parser.add_argument('--workers', default=','.join(map(str, WORKERS)),
+                        help="числа процессов save_sharded/load_sharded через запятую")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="сравнить два отчета")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f_old, open(args.compare[1], encoding='utf-8') as f_new:
+            ratios = compare(json.load(f_old), json.load(f_new))
+        for name, ratio in ratios.items():
+            print(f"{name:<18} x{ratio:.3f}" + ("  ⚠️" if ratio > 1.1 else ""))
+        return
+
+    bookings = SCALES.get(args.scale) or int(args.scale)
+    print(f"--- Бенчмарк: {bookings} бронирований ---")
+    workers = [int(w) for w in args.workers.split(',')]
+    report = run(bookings, args.seed, args.skew, args.memory, args.sample, workers=workers)
+    if args.storage_memory:
+        print("--- Память хранилищ ---")
+        report['storage_memory'] = storage_memory(bookings, args.seed, args.skew)
+    out = args.out or f"bench-{args.scale}-{report['commit'] or 'local'}.json"
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"✅ Отчет сохранен в {out}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+# Многопоточный стресс-тест хранилищ под store_lock и замер пропускной способности
+#
+# Запуск: python -m benchmarks.stress [--seconds 5] [--writers 4] [--readers 4] [--savers 1] [--out report.json]
+#         python -m benchmarks.stress --sweep 1,2,4,8    (пропускная способность чтения по числу потоков)
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from classes import Address, User, Housing, Booking, Review, BookingLogicError, HousingDataError
+from classes.locking import store_lock
+from manager import Manager
+
+START = date(2024, 1, 1).toordinal()
+DAYS = 300  # Период, в котором выбираются даты бронирований
+STALE = 64  # Сколько последних ссылок на объекты хранит писатель для изменений (они могут быть удалены)
+
+
+def populate(users: int, housings: int):
+    """Заполняет хранилища пользователями и жильем для теста; бронирования создают потоки."""
+    for cls in (Review, Booking, Housing, User):
+        cls.clear_all()
+    User.create_many({'user_id': i, 'name': f"Пользователь {i}", 'contact_info': f"user{i}@example.com"}
+                     for i in range(1, users + 1))
+    Housing.create_many({'housing_id': i, 'location': Address("Москва", "Тверская", str(i)),
+                         'price_per_night': 3000.0, 'description': "Квартира"} for i in range(1, housings + 1))
+
+
+def _period(rng: random.Random):
+    start = START + rng.randrange(DAYS)
+    return date.fromordinal(start).isoformat(), date.fromordinal(start + rng.randint(1, 7)).isoformat()
+
+
+def run(seconds: float = 5.0, writers: int = 4, readers: int = 4, savers: int = 1, users: int = 200,
+        housings: int = 20, seed: int = 1, workdir: str = None) -> dict:
+    """
+    Одновременно запускает потоки:
+      писатели — создают бронирования с проверкой пересечений и отзывы, удаляют бронирования,
+                 изредка пользователей и жилье (каскадно) с повторным созданием и изменяют
+                 бронирования, жилье и отзывы по ранее полученным ссылкам, которые другие потоки
+                 могли успеть удалить (такие изменения должны отклоняться);
+      читатели — is_available, find_free_housings и get_all; для каждого раунда замеряется время;
+      сохранение — Manager.save_to_json в цикле.
+    После остановки проверяет согласованность хранилищ и последнего сохраненного файла
+    (check_invariants). Возвращает отчет с числом операций, операциями в секунду, временем
+    раундов чтения и ошибками потоков.
+    """
+    populate(users, housings)
+    ids = itertools.count(1)  # next() у count атомарен в CPython
+    stop = time.perf_counter() + seconds
+    counts = {'write': 0, 'read': 0, 'save': 0}
+    latencies = []
+    errors = []
+    guard = threading.Lock()
+
+    def writer(k):
+        rng = random.Random(seed * 1000 + k)
+        seen = []  # Ранее полученные объекты: к моменту изменения их может удалить другой поток
+        done = 0
+        while time.perf_counter() < stop:
+            try:
+                user, housing = User.get(rng.randint(1, users)), Housing.get(rng.randint(1, housings))
+                if user is None or housing is None:
+                    continue  # Пользователь или жилье удаляются другим потоком
+                try:
+                    seen.append(Booking.create(next(ids), user, housing, *_period(rng)))
+                except (BookingLogicError, ValueError):
+                    pass  # Пересечение периодов или ссылка на только что удаленный объект
+                if rng.random() < 0.3:
+                    try:
+                        seen.append(Review.create(next(ids), user, housing, rng.randint(1, 5), "Отзыв"))
+                    except ValueError:
+                        pass  # Ссылка на только что удаленный объект
+                seen.append(housing)
+                del seen[:-STALE]
+                if rng.random() < 0.3:
+                    _update_stale(rng, rng.choice(seen))
+                if rng.random() < 0.1:
+                    with store_lock.write():  # Проверка и удаление — одна операция
+                        own = Booking.for_user(user)
+                        if own and Booking.get(own[0].booking_id) is own[0]:
+                            own[0].delete()
+                if rng.random() < 0.02:
+                    with store_lock.write():
+                        victim = User.get(rng.randint(1, users))
+                        if victim is not None:
+                            victim.delete()
+                            User.create(victim.user_id, victim.name, victim.contact_info)
+                if rng.random() < 0.01:
+                    with store_lock.write():
+                        victim = Housing.get(rng.randint(1, housings))
+                        if victim is not None:
+                            victim.delete()
+                            Housing.create(victim.housing_id, victim.location, victim.price_per_night, victim.description)
+                done += 1
+            except Exception as e:
+                errors.append(f"writer: {e!r}")
+        with guard:
+            counts['write'] += done
+
+    def reader(k):
+        rng = random.Random(seed * 2000 + k)
+        own = []
+        while time.perf_counter() < stop:
+            try:
+                began = time.perf_counter()
+                start, end = _period(rng)
+                housing = Housing.get(rng.randint(1, housings))
+                if housing is not None:
+                    Booking.is_available(housing, start, end)
+                Booking.find_free_housings(start, end, city="Москва")
+                len(Booking.get_all())
+                own.append(time.perf_counter() - began)
+            except Exception as e:
+                errors.append(f"reader: {e!r}")
+        with guard:
+            counts['read'] += len(own)
+            latencies.extend(own)
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        out = os.path.join(tmp, 'stress.json')
+
+        def saver():
+            done = 0
+            while time.perf_counter() < stop:
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        Manager.save_to_json(out)
+                    done += 1
+                except Exception as e:
+                    errors.append(f"saver: {e!r}")
+            with guard:
+                counts['save'] += done
+
+        threads = ([threading.Thread(target=writer, args=(k,)) for k in range(writers)]
+                   + [threading.Thread(target=reader, args=(k,)) for k in range(readers)]
+                   + [threading.Thread(target=saver) for _ in range(savers)])
+        began = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - began
+        check_invariants(out if counts['save'] else None)
+
+    latencies.sort()
+    return {'seconds': round(elapsed, 3), 'threads': {'writers': writers, 'readers': readers, 'savers': savers},
+            'ops': counts, 'ops_per_second': {role: round(n / elapsed, 1) for role, n in counts.items()},
+            'read_round_ms': {'p50': _percentile(latencies, 0.5), 'p99': _percentile(latencies, 0.99),
+                              'max': _percentile(latencies, 1.0)},
+            'bookings': len(Booking._instances), 'errors': errors}
+
+
+def _update_stale(rng: random.Random, obj):
+    """
+    Изменяет или удаляет объект по ссылке, полученной раньше. Если объект уже удален другим
+    потоком, операция должна быть отклонена исключением класса, не затронув индексы.
+    """
+    try:
+        if not isinstance(obj, Housing) and rng.random() < 0.2:
+            obj.delete()
+        elif isinstance(obj, Booking):
+            obj.update(*_period(rng))
+        elif isinstance(obj, Housing):
+            obj.update(price_per_night=float(rng.randrange(1000, 5000, 100)))
+        else:
+            obj.update(rating=rng.randint(1, 5))
+    except (BookingLogicError, HousingDataError, ValueError):
+        pass  # Пересечение периодов или объект уже удален (ValueError — отзыв)
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    return round(values[min(int(q * len(values)), len(values) - 1)] * 1000, 3)
+
+
+def check_invariants(saved: str = None):
+    """
+    Проверяет, что параллельные операции оставили хранилища согласованными: периоды одного
+    жилья не пересекаются и совпадают с периодами бронирований, индексы (в том числе индекс цен
+    и гистограммы оценок жилья) совпадают с хранилищем, бронирования не ссылаются на удаленных
+    пользователей и жилье, а сохраненный файл saved ссылается только на свои объекты.
+    Нарушение — AssertionError.
+    """
+    bookings = Booking.get_all()
+    calendar = sorted((housing_id,) + span for housing_id, spans in Booking._calendar.items() for span in spans)
+    assert calendar == sorted((b.housing_id,) + b._span + (b.booking_id,) for b in bookings), \
+        "календарь не совпадает с хранилищем"
+    for housing_id, spans in Booking._calendar.items():
+        for prev, cur in zip(spans, spans[1:]):
+            assert prev[1] <= cur[0], f"пересекаются бронирования {prev[2]} и {cur[2]} жилья {housing_id}"
+    assert sum(len(v) for v in Booking._by_user.values()) == len(bookings), "индекс по пользователям не совпадает"
+    assert sum(len(v) for v in Booking._by_housing.values()) == len(bookings), "индекс по жилью не совпадает"
+    for b in bookings:
+        assert b.user is not None and b.housing is not None, f"бронирование {b.booking_id} ссылается на удаленный объект"
+    housings = Housing.get_all()
+    assert list(Housing._prices) == sorted((h.price_per_night, h.housing_id) for h in housings), "индекс цен не совпадает"
+    ratings = {h.housing_id: [0] * 5 for h in housings}
+    for r in Review.get_all():
+        assert r.user is not None and r.housing_id in ratings, f"отзыв {r.review_id} ссылается на удаленный объект"
+        ratings[r.housing_id][r.rating - 1] += 1
+    for h in housings:
+        assert h._ratings == ratings[h.housing_id], f"гистограмма оценок жилья {h.housing_id} не совпадает с отзывами"
+    if saved is not None:
+        with open(saved, encoding='utf-8') as f:
+            data = json.load(f)
+        users = {u['user_id'] for u in data['users']}
+        housings = {h['housing_id'] for h in data['housings']}
+        assert all(b['user_id'] in users and b['housing_id'] in housings for b in data['bookings']), \
+            "сохраненный файл несогласован"
+
+
+def sweep(threads: list, seconds: float = 2.0) -> dict:
+    """
+    Пропускная способность: раунды чтения в секунду при разном числе потоков-читателей
+    без писателей и при тех же читателях с одним писателем.
+    """
+    results = {}
+    for n in threads:
+        read_only = run(seconds, writers=0, readers=n, savers=0)
+        mixed = run(seconds, writers=1, readers=n, savers=0)
+        results[n] = {'read_only': read_only['ops_per_second']['read'], 'with_writer': mixed['ops_per_second']['read'],
+                      'writer': mixed['ops_per_second']['write']}
+        print(f"  читателей {n:<3} {results[n]['read_only']:10.1f} раунд/с  с писателем "
+              f"{results[n]['with_writer']:10.1f} раунд/с  запись {results[n]['writer']:10.1f} оп/с")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Многопоточный стресс-тест хранилищ.")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--savers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sweep', help="числа потоков-читателей через запятую для замера пропускной способности")
+    parser.add_argument('--out', help="файл JSON-отчета")
+    args = parser.parse_args()
+
+    if args.sweep:
+        print("--- Пропускная способность чтения ---")
+        report = sweep([int(n) for n in args.sweep.split(',')], args.seconds)
+    else:
+        print(f"--- Стресс-тест: {args.writers} писателей, {args.readers} читателей, {args.savers} сохранений, "
+              f"{args.seconds} с ---")
+        try:
+            report = run(args.seconds, args.writers, args.readers, args.savers, seed=args.seed)
+        except AssertionError as e:
+            print(f"❌ Нарушена согласованность: {e}")
+            return 1
+        for role, n in report['ops'].items():
+            print(f"  {role:<6} {n:10d} оп  {report['ops_per_second'][role]:10.1f} оп/с")
+        latency = report['read_round_ms']
+        print(f"  раунд чтения: p50 {latency['p50']} мс, p99 {latency['p99']} мс, макс. {latency['max']} мс")
+        if report['errors']:
+            print(f"❌ Ошибки в потоках ({len(report['errors'])}): {report['errors'][:5]}")
+            return 1
+        print("✅ Ошибок нет, хранилища согласованы")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"✅ Отчет сохранен в {args.out}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,4 +3,4 @@ from .address import Address, AddressDataError
 from .user import User, UserDataError
 from .house import Housing, HousingDataError
 from .booking import Booking, BookingLogicError
-from .review import Review, InvalidRatingError
\ No newline at end of file
+from .review import Review, InvalidRatingError
@@ -1,8 +1,12 @@
+import sys
+
 # Кастомное исключение для ошибок, связанных с адресом
 class AddressDataError(Exception):
     pass
 
 class Address:
+    __slots__ = ('city', 'street', 'building_number', 'postal_code')
+
     def __init__(self, city: str, street: str, building_number: str, postal_code: int = None):
         if not isinstance(city, str) or not city:
             raise AddressDataError("Город должен быть непустой строкой.")
@@ -13,8 +17,9 @@ class Address:
         if postal_code is not None and (not isinstance(postal_code, int) or postal_code <= 0):
             raise AddressDataError("Почтовый индекс должен быть положительным числом.")
 
-        self.city = city
-        self.street = street
+        # Города и улицы повторяются у тысяч объектов — храним одну копию строки
+        self.city = sys.intern(city)
+        self.street = sys.intern(street)
         self.building_number = building_number
         self.postal_code = postal_code
 
@@ -1,12 +1,35 @@
+import bisect
+from datetime import date
 from .user import User
 from .house import Housing
+from .events import emit
+from .paging import paged_source
+from .locking import store_lock
 
 class BookingLogicError(Exception):
     """Собственное исключение для ошибок в логике бронирования."""
     pass
 
+def _parse_date(value) -> int:
+    """Переводит дату (строку формата ГГГГ-ММ-ДД или datetime.date) в порядковый номер дня."""
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        raise BookingLogicError(f"Некорректная дата '{value}'. Ожидается формат ГГГГ-ММ-ДД.") from None
+
 class Booking:
-    _instances = {}  # Внутриклассовое хранилище: {booking_id: booking_object}
+    # Даты хранятся парой порядковых номеров дней _span = (start, end) и разбираются один раз.
+    # Ссылки на пользователя и жилье хранятся как ID и разрешаются через get при обращении.
+    __slots__ = ('booking_id', 'user_id', 'housing_id', '_span', '__weakref__')
+    _instances = {}  # Внутриклассовое хранилище (или кеш, см. storage.py): {booking_id: booking_object}
+    _lazy = None  # Отложенный источник объектов (снимок или база), см. Manager.load_snapshot
+    _by_user = {}  # Индекс: {user_id: {booking_id: booking_object}}
+    _by_housing = {}  # Индекс: {housing_id: {booking_id: booking_object}}
+    # Интервальный индекс: {housing_id: [(start, end, booking_id), ...]}, отсортирован по началу.
+    # Периоды одного жилья не пересекаются, поэтому список отсортирован и по окончанию.
+    _calendar = {}
 
     def __init__(self, booking_id: int, user: User, housing: Housing, start_date: str, end_date: str):
         if not isinstance(booking_id, int) or booking_id <= 0:
@@ -19,46 +42,300 @@ class Booking:
             raise BookingLogicError("Даты начала и окончания не могут быть пустыми.")
 
         self.booking_id = booking_id
-        self.user = user
-        self.housing = housing
-        self.start_date = start_date
-        self.end_date = end_date
+        self.user_id = user.user_id
+        self.housing_id = housing.housing_id
+        self._span = self._period(start_date, end_date)
+
+    @property
+    def start_date(self) -> str:
+        """Дата заезда в формате ГГГГ-ММ-ДД."""
+        return date.fromordinal(self._span[0]).isoformat()
+
+    @property
+    def end_date(self) -> str:
+        """Дата выезда в формате ГГГГ-ММ-ДД."""
+        return date.fromordinal(self._span[1]).isoformat()
+
+    @property
+    def nights(self) -> int:
+        """Число ночей бронирования."""
+        return self._span[1] - self._span[0]
+
+    @property
+    def user(self) -> User:
+        """Пользователь, сделавший бронирование (None, если он удален)."""
+        return User.get(self.user_id)
+
+    @property
+    def housing(self) -> Housing:
+        """Забронированное жилье (None, если оно удалено)."""
+        return Housing.get(self.housing_id)
+
+    @property
+    def total_price(self) -> float:
+        """Стоимость бронирования по текущей цене за ночь."""
+        return self.nights * self.housing.price_per_night
 
     @classmethod
     def create(cls, booking_id: int, user: User, housing: Housing, start_date: str, end_date: str):
         """CREATE: Создает объект бронирования и сохраняет его."""
-        if booking_id in cls._instances:
-            raise ValueError(f"Бронирование с ID {booking_id} уже существует.")
+        with store_lock.write():
+            if cls.get(booking_id) is not None:
+                raise ValueError(f"Бронирование с ID {booking_id} уже существует.")
         
-        booking = cls(booking_id, user, housing, start_date, end_date)
-        cls._instances[booking_id] = booking
-        return booking
+            booking = cls(booking_id, user, housing, start_date, end_date)
+            cls._check_refs(booking.user_id, booking.housing_id)
+            if paged_source(cls) is None:
+                cls._materialize()
+            if cls._conflicts(booking.housing_id, *booking._span):
+                raise BookingLogicError(f"Жилье {housing.housing_id} уже забронировано на период {booking.start_date} — {booking.end_date}.")
+            cls._register(booking)
+            emit('create', booking)
+            return booking
+
+    @classmethod
+    def create_many(cls, rows):
+        """
+        CREATE: Пакетно создает бронирования из словарей с аргументами create.
+        Пачка применяется целиком или отклоняется целиком: ID и пересечения периодов
+        (между собой и с уже существующими бронированиями) проверяются до изменения хранилища.
+        """
+        bookings = [cls(**row) for row in rows]
+        ids = {b.booking_id for b in bookings}
+        if len(ids) != len(bookings):
+            raise ValueError("В пакете есть бронирования с повторяющимися ID.")
+        with store_lock.write():
+            for b in bookings:
+                cls._check_refs(b.user_id, b.housing_id)
+            source = paged_source(cls)
+            if source is not None:
+                taken = source.existing(ids)
+            else:
+                cls._materialize()
+                taken = ids & cls._instances.keys()
+            if taken:
+                raise ValueError(f"Бронирования с ID {sorted(taken)[:10]} уже существуют.")
+
+            spans = {}  # {housing_id: [(start, end, booking_id), ...]}
+            for b in bookings:
+                spans.setdefault(b.housing_id, []).append(b._span + (b.booking_id,))
+            for housing_id, new in spans.items():
+                new.sort()
+                for prev, cur in zip(new, new[1:]):
+                    if prev[1] > cur[0]:
+                        raise BookingLogicError(f"Бронирования {prev[2]} и {cur[2]} жилья {housing_id} пересекаются.")
+                for start, end, booking_id in new:
+                    if cls._conflicts(housing_id, start, end):
+                        raise BookingLogicError(f"Бронирование {booking_id} пересекается с существующим бронированием жилья {housing_id}.")
+
+            # Одна сортировка на жилье: календарь и пачка уже упорядочены, и сортировка слиянием
+            # сводит их за линейное время. В постраничном режиме кеш может вытеснить часть пачки
+            # еще до этого, поэтому периоды добавляются вместе с объектами
+            for b in bookings:
+                cls._register(b, index_span=source is not None)
+            if source is None:
+                for housing_id, new in spans.items():
+                    calendar = cls._calendar.setdefault(housing_id, [])
+                    calendar.extend(new)
+                    calendar.sort()
+            for b in bookings:
+                emit('create', b)
+            return bookings
+
+    @staticmethod
+    def _check_refs(user_id: int, housing_id: int):
+        """Проверяет, что пользователь и жилье не удалены из хранилищ (например, другим потоком)."""
+        if User.get(user_id) is None:
+            raise BookingLogicError(f"Пользователь с ID {user_id} удален, создание бронирования невозможно.")
+        if Housing.get(housing_id) is None:
+            raise BookingLogicError(f"Жилье с ID {housing_id} удалено, создание бронирования невозможно.")
+
+    @classmethod
+    def _register(cls, booking, index_span: bool = True):
+        """
+        Помещает проверенное бронирование в хранилище и индексы. Пакетная вставка передает
+        index_span=False и добавляет периоды пачки в календарь сама, по одной сортировке на жилье.
+        """
+        cls._instances[booking.booking_id] = booking
+        cls._by_user.setdefault(booking.user_id, {})[booking.booking_id] = booking
+        cls._by_housing.setdefault(booking.housing_id, {})[booking.booking_id] = booking
+        if index_span:
+            bisect.insort(cls._calendar.setdefault(booking.housing_id, []), booking._span + (booking.booking_id,))
+
+    @classmethod
+    def _unregister(cls, booking):
+        """Убирает бронирование из индексов (при удалении или вытеснении из кеша)."""
+        cls._unindex(cls._by_user, booking.user_id, booking.booking_id)
+        cls._unindex(cls._by_housing, booking.housing_id, booking.booking_id)
+        cls._remove_span(booking.housing_id, booking._span, booking.booking_id)
 
     @classmethod
     def get(cls, booking_id: int):
         """READ: Находит бронирование по ID."""
-        return cls._instances.get(booking_id)
+        obj = cls._instances.get(booking_id)
+        if obj is None and cls._lazy is not None:
+            with store_lock.fill():
+                obj = cls._instances.get(booking_id)
+                if obj is None and cls._lazy is not None:
+                    obj = cls._lazy.load(booking_id)
+        return obj
 
     def update(self, start_date: str = None, end_date: str = None):
-        """UPDATE: Обновляет даты конкретного бронирования."""
-        if start_date is not None:
-            self.start_date = start_date
-        if end_date is not None:
-            self.end_date = end_date
+        """UPDATE: Обновляет даты конкретного бронирования с проверкой пересечений."""
+        with store_lock.write():
+            # get возвращает в кеш объект, вытесненный из него; удаленное бронирование (ссылка,
+            # оставшаяся у другого потока) менять нельзя — его период уже убран из календаря
+            if self.__class__.get(self.booking_id) is not self:
+                raise BookingLogicError(f"Бронирование с ID {self.booking_id} удалено, изменение невозможно.")
+            start = self._span[0] if start_date is None else _parse_date(start_date)
+            end = self._span[1] if end_date is None else _parse_date(end_date)
+            if start >= end:
+                raise BookingLogicError("Дата окончания должна быть позже даты начала.")
+
+            cls = self.__class__
+            if paged_source(cls) is None:
+                cls._materialize()
+            housing_id = self.housing_id
+            cls._remove_span(housing_id, self._span, self.booking_id)
+            if cls._conflicts(housing_id, start, end, exclude=self.booking_id):
+                bisect.insort(cls._calendar.setdefault(housing_id, []), self._span + (self.booking_id,))
+                raise BookingLogicError(f"Жилье {housing_id} уже забронировано на период "
+                                        f"{date.fromordinal(start)} — {date.fromordinal(end)}.")
+            bisect.insort(cls._calendar.setdefault(housing_id, []), (start, end, self.booking_id))
+            self._span = (start, end)
+            emit('update', self, {'start_date': self.start_date, 'end_date': self.end_date})
 
     def delete(self):
         """DELETE: Удаляет бронирование. Каскадное удаление не требуется."""
-        del self.__class__._instances[self.booking_id]
+        with store_lock.write():
+            cls = self.__class__
+            # get возвращает в кеш объект, вытесненный из него; устаревшая ссылка не должна
+            # удалять новое бронирование с тем же ID и его период в календаре
+            if cls.get(self.booking_id) is not self:
+                raise BookingLogicError(f"Бронирование с ID {self.booking_id} уже удалено.")
+            del cls._instances[self.booking_id]
+            cls._unregister(self)
+            emit('delete', self)
+
+    @staticmethod
+    def _unindex(index: dict, key: int, item_id: int):
+        """Убирает запись из вторичного индекса, удаляя опустевшие корзины."""
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(item_id, None)
+            if not bucket:
+                del index[key]
+
+    @staticmethod
+    def _period(start_date: str, end_date: str):
+        """Разбирает даты бронирования и проверяет, что период не пустой."""
+        start, end = _parse_date(start_date), _parse_date(end_date)
+        if start >= end:
+            raise BookingLogicError("Дата окончания должна быть позже даты начала.")
+        return start, end
+
+    @classmethod
+    def _conflicts(cls, housing_id: int, start: int, end: int, exclude: int = None) -> bool:
+        """
+        Проверяет пересечение периода [start, end) с бронированиями жилья за O(log n).
+        exclude — ID бронирования, которое не учитывается (в постраничном режиме период
+        изменяемого бронирования остается в базе до записи изменения).
+        """
+        source = paged_source(cls)
+        if source is not None:
+            return source.conflicts(housing_id, start, end, exclude)
+        calendar = cls._calendar.get(housing_id)
+        if not calendar:
+            return False
+        # Все периоды левее i начинаются раньше end; пересечься может только последний из них
+        i = bisect.bisect_left(calendar, (end,))
+        return i > 0 and calendar[i - 1][1] > start
+
+    @classmethod
+    def _remove_span(cls, housing_id: int, span: tuple, booking_id: int):
+        """Убирает период бронирования из интервального индекса жилья."""
+        calendar = cls._calendar.get(housing_id)
+        if not calendar:
+            return
+        entry = span + (booking_id,)
+        i = bisect.bisect_left(calendar, entry)
+        if i == len(calendar) or calendar[i] != entry:
+            return  # Периода нет в календаре: удалять чужой период нельзя
+        del calendar[i]
+        if not calendar:
+            del cls._calendar[housing_id]
+
+    @classmethod
+    def is_available(cls, housing: Housing, start_date: str, end_date: str) -> bool:
+        """Проверяет, свободно ли жилье в период [start_date, end_date)."""
+        start, end = cls._period(start_date, end_date)
+        if paged_source(cls) is not None:
+            return not cls._conflicts(housing.housing_id, start, end)  # Один запрос к базе
+        cls._materialize()
+        with store_lock.read():
+            return not cls._conflicts(housing.housing_id, start, end)
+
+    @classmethod
+    def find_free_housings(cls, start_date: str, end_date: str, city: str = None):
+        """Возвращает жилье, свободное в указанный период (опционально — только в городе city)."""
+        start, end = cls._period(start_date, end_date)
+        source = paged_source(Housing)
+        if source is not None:
+            return source.free_housings(start, end, city)  # Один запрос к базе
+        cls._materialize()
+        housings = Housing.get_all() if city is None else Housing.search(city=city)
+        with store_lock.read():
+            return [h for h in housings
+                    if not cls._conflicts(h.housing_id, start, end)]
+
+    @classmethod
+    def for_user(cls, user: User):
+        """Возвращает все бронирования пользователя через индекс, без обхода хранилища."""
+        source = paged_source(cls)
+        if source is not None:
+            return source.load_many(source.ids_by('user_id', user.user_id))
+        cls._materialize()
+        return list(cls._by_user.get(user.user_id, {}).values())
+
+    @classmethod
+    def for_housing(cls, housing: Housing):
+        """Возвращает все бронирования жилья через индекс, без обхода хранилища."""
+        source = paged_source(cls)
+        if source is not None:
+            return source.load_many(source.ids_by('housing_id', housing.housing_id))
+        cls._materialize()
+        return list(cls._by_housing.get(housing.housing_id, {}).values())
 
     @classmethod
     def get_all(cls):
         """Вспомогательный метод для получения всех экземпляров."""
+        source = paged_source(cls)
+        if source is not None:
+            return source.objects()
+        cls._materialize()
         return list(cls._instances.values())
 
+    @classmethod
+    def _materialize(cls):
+        """
+        Догружает все еще не созданные объекты из отложенного источника, если он подключен.
+        Источник постраничного режима не догружается: запросы к нему выполняет он сам.
+        """
+        if cls._lazy is not None and not cls._lazy.paged:
+            with store_lock.fill():
+                if cls._lazy is not None and not cls._lazy.paged:
+                    cls._lazy.load_all()
+
     @classmethod
     def clear_all(cls):
         """Вспомогательный метод для очистки хранилища."""
-        cls._instances.clear()
+        with store_lock.write():
+            cls._instances.clear()
+            cls._lazy = None
+            cls._by_user.clear()
+            cls._by_housing.clear()
+            cls._calendar.clear()
+            emit('clear', cls)
 
     def __str__(self):
-        return f"Бронь #{self.booking_id}: {self.user.name} -> жилье {self.housing.housing_id}"
\ No newline at end of file
+        return f"Бронь #{self.booking_id}: {self.user.name} -> жилье {self.housing_id}"
\ No newline at end of file
@@ -0,0 +1,21 @@
+# Подписка на изменения хранилищ: журнал, отслеживание изменений и т.п.
+_listeners = []
+
+
+def subscribe(listener):
+    """
+    Регистрирует обработчик listener(op, obj, changes), который вызывается после каждой
+    успешной операции: op — 'create', 'update', 'delete' или 'clear' (тогда obj — класс),
+    changes — словарь измененных полей для 'update', иначе None.
+    """
+    _listeners.append(listener)
+
+
+def unsubscribe(listener):
+    """Отключает ранее зарегистрированный обработчик."""
+    _listeners.remove(listener)
+
+
+def emit(op: str, obj, changes: dict = None):
+    for listener in _listeners:
+        listener(op, obj, changes)
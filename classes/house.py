@@ -1,11 +1,21 @@
+import heapq
 from .address import Address
+from .events import emit
+from .paging import paged_source
+from .locking import store_lock
+from .sortedlist import SortedList
 
 class HousingDataError(Exception):
     """Собственное исключение для ошибок в данных жилья."""
     pass
 
 class Housing:
-    _instances = {}  # Внутриклассовое хранилище: {housing_id: housing_object}
+    __slots__ = ('housing_id', 'location', 'price_per_night', 'description', '_ratings', '__weakref__')
+    _instances = {}  # Внутриклассовое хранилище (или кеш, см. storage.py): {housing_id: housing_object}
+    _lazy = None  # Отложенный источник объектов (снимок или база), см. Manager.load_snapshot
+    _by_city = {}  # Индекс: {city: {housing_id: housing_object}}
+    _by_street = {}  # Индекс: {street: {housing_id: housing_object}}
+    _prices = SortedList()  # Индекс цен: отсортированные пары (price_per_night, housing_id)
 
     def __init__(self, housing_id: int, location: Address, price_per_night: float, description: str):
         if not isinstance(housing_id, int) or housing_id <= 0:
@@ -21,54 +31,257 @@ class Housing:
         self.location = location
         self.price_per_night = price_per_night
         self.description = description
+        self._ratings = [0] * 5  # Гистограмма оценок отзывов: _ratings[k - 1] — число оценок k
 
     @classmethod
     def create(cls, housing_id: int, location: Address, price_per_night: float, description: str):
         """CREATE: Создает объект жилья и сохраняет его."""
-        if housing_id in cls._instances:
-            raise ValueError(f"Жилье с ID {housing_id} уже существует.")
+        with store_lock.write():
+            if cls.get(housing_id) is not None:
+                raise ValueError(f"Жилье с ID {housing_id} уже существует.")
         
-        house = cls(housing_id, location, price_per_night, description)
-        cls._instances[housing_id] = house
-        return house
+            house = cls(housing_id, location, price_per_night, description)
+            cls._register(house)
+            emit('create', house)
+            return house
+
+    @classmethod
+    def create_many(cls, rows):
+        """
+        CREATE: Пакетно создает жилье из словарей с аргументами create.
+        Пачка применяется целиком или отклоняется целиком: ID проверяются сразу для всех строк.
+        """
+        houses = [cls(**row) for row in rows]
+        ids = {h.housing_id for h in houses}
+        if len(ids) != len(houses):
+            raise ValueError("В пакете есть жилье с повторяющимися ID.")
+        with store_lock.write():
+            source = paged_source(cls)
+            if source is not None:
+                taken = source.existing(ids)
+            else:
+                cls._materialize()
+                taken = ids & cls._instances.keys()
+            if taken:
+                raise ValueError(f"Жилье с ID {sorted(taken)[:10]} уже существует.")
+            # Одно слияние цен на пачку; в постраничном режиме кеш может вытеснить часть пачки
+            # еще до слияния, поэтому цены добавляются вместе с объектами
+            for house in houses:
+                cls._register(house, index_price=source is not None)
+            if source is None:
+                cls._prices.update((house.price_per_night, house.housing_id) for house in houses)
+            for house in houses:
+                emit('create', house)
+            return houses
+
+    @classmethod
+    def _register(cls, house, index_price: bool = True):
+        """
+        Помещает проверенное жилье в хранилище и поисковые индексы. Пакетная вставка передает
+        index_price=False и добавляет цены всей пачки в индекс одним вызовом _prices.update.
+        """
+        cls._instances[house.housing_id] = house
+        cls._by_city.setdefault(house.location.city, {})[house.housing_id] = house
+        cls._by_street.setdefault(house.location.street, {})[house.housing_id] = house
+        if index_price:
+            cls._prices.add((house.price_per_night, house.housing_id))
+
+    @classmethod
+    def _unregister(cls, house):
+        """Убирает жилье из поисковых индексов (при удалении или вытеснении из кеша)."""
+        cls._unindex(cls._by_city, house.location.city, house.housing_id)
+        cls._unindex(cls._by_street, house.location.street, house.housing_id)
+        cls._remove_price(house.price_per_night, house.housing_id)
+
+    @staticmethod
+    def _unindex(index: dict, key, item_id: int):
+        """Убирает запись из индекса, удаляя опустевшие корзины."""
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(item_id, None)
+            if not bucket:
+                del index[key]
+
+    @classmethod
+    def _remove_price(cls, price, housing_id: int):
+        cls._prices.discard((price, housing_id))
 
     @classmethod
     def get(cls, housing_id: int):
         """READ: Находит жилье по ID."""
-        return cls._instances.get(housing_id)
+        obj = cls._instances.get(housing_id)
+        if obj is None and cls._lazy is not None:
+            with store_lock.fill():
+                obj = cls._instances.get(housing_id)
+                if obj is None and cls._lazy is not None:
+                    obj = cls._lazy.load(housing_id)
+        return obj
 
     def update(self, price_per_night: float = None, description: str = None):
         """UPDATE: Обновляет данные конкретного жилья."""
-        if price_per_night is not None:
-            self.price_per_night = price_per_night
-        if description is not None:
-            self.description = description
+        # Проверки до изменения индекса цен, как в __init__
+        if price_per_night is not None and (not isinstance(price_per_night, (int, float)) or price_per_night <= 0):
+            raise HousingDataError("Цена за ночь должна быть положительным числом.")
+        if description is not None and not isinstance(description, str):
+            raise TypeError("Описание должно быть строкой.")
+        with store_lock.write():
+            # get возвращает в кеш объект, вытесненный из него; удаленное жилье нельзя
+            # возвращать в индекс цен — search искал бы его в хранилище
+            if self.__class__.get(self.housing_id) is not self:
+                raise HousingDataError(f"Жилье с ID {self.housing_id} удалено, изменение невозможно.")
+            if price_per_night is not None and price_per_night != self.price_per_night:
+                cls = self.__class__
+                cls._remove_price(self.price_per_night, self.housing_id)
+                self.price_per_night = price_per_night
+                cls._prices.add((price_per_night, self.housing_id))
+            if description is not None:
+                self.description = description
+            emit('update', self, {k: v for k, v in (('price_per_night', price_per_night), ('description', description)) if v is not None})
 
     def delete(self):
         """DELETE: Удаляет жилье и все связанные с ним бронирования и отзывы."""
         from .booking import Booking
         from .review import Review
-        
-        # Каскадное удаление
-        for booking in list(Booking._instances.values()):
-            if booking.housing.housing_id == self.housing_id:
+
+        with store_lock.write():
+            # get возвращает в кеш объект, вытесненный из него; устаревшая ссылка не должна
+            # удалять пересозданное жилье вместе с его бронированиями и отзывами
+            if self.__class__.get(self.housing_id) is not self:
+                raise HousingDataError(f"Жилье с ID {self.housing_id} уже удалено.")
+
+            # Каскадное удаление
+            for booking in Booking.for_housing(self):
                 booking.delete()
         
-        for review in list(Review._instances.values()):
-            if review.housing.housing_id == self.housing_id:
+            for review in Review.for_housing(self):
                 review.delete()
                 
-        del self.__class__._instances[self.housing_id]
+            cls = self.__class__
+            del cls._instances[self.housing_id]
+            cls._unregister(self)
+            emit('delete', self)
+
+    @property
+    def rating_count(self) -> int:
+        """Число отзывов о жилье (поддерживается отзывами, без обхода хранилища)."""
+        return sum(self._rating_counts())
+
+    @property
+    def rating_avg(self):
+        """Средняя оценка жилья или None, если отзывов нет."""
+        ratings = self._rating_counts()
+        count = sum(ratings)
+        if not count:
+            return None
+        return sum(k * n for k, n in enumerate(ratings, 1)) / count
+
+    @property
+    def rating_histogram(self) -> dict:
+        """Распределение оценок: {оценка: число отзывов}."""
+        return dict(enumerate(self._rating_counts(), 1))
+
+    def _rating_counts(self) -> list:
+        """
+        Гистограмма оценок жилья. В постраничном режиме ее считает источник отзывов, иначе
+        она поддерживается отзывами и полна после загрузки всех отзывов из отложенного источника.
+        """
+        from .review import Review
+        source = paged_source(Review)
+        if source is not None:
+            return source.ratings(self.housing_id)
+        Review._materialize()
+        return self._ratings
+
+    @classmethod
+    def best_rated(cls, city: str, n: int = 10, min_reviews: int = 1):
+        """
+        Возвращает n жилищ города city с наибольшей средней оценкой (при равенстве — с большим
+        числом отзывов). Используется частичная выборка через кучу, без сортировки всей таблицы
+        (в постраничном режиме — запрос к базе).
+        """
+        from .review import Review
+        source = paged_source(cls)
+        if source is not None:
+            return source.best_rated(city, n, max(min_reviews, 1))
+        Review._materialize()
+        cls._materialize()
+        with store_lock.read():
+            candidates = [h for h in cls._by_city.get(city, {}).values() if sum(h._ratings) >= max(min_reviews, 1)]
+        return heapq.nlargest(n, candidates, key=lambda h: (h.rating_avg, sum(h._ratings)))
+
+    @classmethod
+    def search(cls, city: str = None, street: str = None, min_price: float = None, max_price: float = None,
+               order_by: str = None, limit: int = None):
+        """
+        Ищет жилье по городу, улице и диапазону цены [min_price, max_price].
+        Город и улица ищутся по хеш-индексам, диапазон цены — бинарным поиском по индексу цен;
+        перебирается наименьшее из подходящих множеств (в постраничном режиме поиск выполняет
+        база по своим индексам). order_by: 'price', '-price' или None.
+        """
+        if order_by not in (None, 'price', '-price'):
+            raise ValueError("order_by должен быть 'price', '-price' или None.")
+        source = paged_source(cls)
+        if source is not None:
+            return source.search(city, street, min_price, max_price, order_by, limit)
+        cls._materialize()
+        with store_lock.read():
+            lo = 0 if min_price is None else cls._prices.bisect_left((min_price,))
+            hi = len(cls._prices) if max_price is None else cls._prices.bisect_left((max_price, float('inf')))
+            buckets = []
+            if city is not None:
+                buckets.append(cls._by_city.get(city, {}))
+            if street is not None:
+                buckets.append(cls._by_street.get(street, {}))
+
+            if not buckets or hi - lo <= min(map(len, buckets)):
+                # Диапазон цен уже упорядочен — при order_by='price' можно остановиться на limit
+                in_range = cls._prices.islice(lo, hi, reverse=order_by == '-price')
+                result = []
+                for _, housing_id in in_range:
+                    if all(housing_id in b for b in buckets):
+                        result.append(cls._instances[housing_id])
+                        if limit is not None and order_by is not None and len(result) >= limit:
+                            break
+            else:
+                smallest = min(buckets, key=len)
+                result = [h for h in smallest.values()
+                          if all(h.housing_id in b for b in buckets)
+                          and (min_price is None or h.price_per_night >= min_price)
+                          and (max_price is None or h.price_per_night <= max_price)]
+                if order_by is not None:
+                    result.sort(key=lambda h: (h.price_per_night, h.housing_id), reverse=order_by == '-price')
+        return result if limit is None else result[:limit]
 
     @classmethod
     def get_all(cls):
         """Вспомогательный метод для получения всех экземпляров."""
+        source = paged_source(cls)
+        if source is not None:
+            return source.objects()
+        cls._materialize()
         return list(cls._instances.values())
+
+    @classmethod
+    def _materialize(cls):
+        """
+        Догружает все еще не созданные объекты из отложенного источника, если он подключен.
+        Источник постраничного режима не догружается: запросы к нему выполняет он сам.
+        """
+        if cls._lazy is not None and not cls._lazy.paged:
+            with store_lock.fill():
+                if cls._lazy is not None and not cls._lazy.paged:
+                    cls._lazy.load_all()
         
     @classmethod
     def clear_all(cls):
         """Вспомогательный метод для очистки хранилища."""
-        cls._instances.clear()
+        with store_lock.write():
+            cls._instances.clear()
+            cls._lazy = None
+            cls._by_city.clear()
+            cls._by_street.clear()
+            cls._prices.clear()
+            emit('clear', cls)
 
     def __str__(self):
         return f"Жилье (ID: {self.housing_id}): {self.location} | Цена: {self.price_per_night}"
\ No newline at end of file
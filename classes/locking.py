@@ -0,0 +1,137 @@
+# Блокировка чтения/записи, общая для всех хранилищ классов
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+    Блокировка «много читателей или один писатель».
+    Читатели не мешают друг другу; писатель получает хранилища в монопольное владение,
+    поэтому многотабличные операции (каскадное удаление, проверка пересечений с вставкой
+    бронирования, загрузка из файла) выполняются атомарно. Обе блокировки реентерабельны,
+    писатель может брать блокировку чтения, а вот переход от чтения к записи запрещен —
+    он приводил бы к взаимной блокировке двух читателей.
+    Ожидающий писатель не пропускает вперед новых читателей, а освобождающий запись писатель
+    пропускает вперед всех читателей, ждавших в этот момент: читатели и писатели чередуются,
+    и поток записи в цикле не может захватывать блокировку снова и снова, пока ждут читатели.
+    Одиночные обращения к словарям (get, копия в get_all) атомарны в CPython и блокировку
+    не берут; она нужна там, где чтение состоит из нескольких шагов.
+    Заполнение кешей из отложенных источников (промах get, догрузка снимка) — это чтение
+    хранилища, поэтому оно идет под блокировкой fill: чтение плюс отдельный мьютекс,
+    который не пускает два потока заполнять кеши одновременно. Ее можно брать внутри
+    чтения, а читатели, которые находят объекты в кеше, заполнение не ждут.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}  # {thread_id: глубина вложенности}
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._waiting_readers = 0
+        self._read_gen = 0  # Номер освобождения записи: меняется, когда ждущих читателей пропускают
+        self._admitted = 0  # Пропущенные читатели, еще не взявшие блокировку; писатели их ждут
+        self._fill = threading.RLock()  # Заполнение кешей: один поток за раз, см. fill
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me and me not in self._readers:
+                gen = self._read_gen
+                self._waiting_readers += 1
+                try:
+                    while self._writer is not None or (self._waiting_writers and self._read_gen == gen):
+                        self._cond.wait()
+                finally:
+                    self._waiting_readers -= 1
+                    if self._read_gen != gen:
+                        self._admitted -= 1
+                        if not self._admitted:
+                            self._cond.notify_all()
+            self._readers[me] = self._readers.get(me, 0) + 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Нельзя взять блокировку записи, удерживая блокировку чтения.")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers or self._admitted:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth:
+                return
+            self._writer = None
+            if self._waiting_readers:
+                self._read_gen += 1
+                self._admitted = self._waiting_readers
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    @contextmanager
+    def fill(self):
+        """Блокировка чтения и мьютекс заполнения кешей (порядок захвата всегда этот)."""
+        with self.read(), self._fill:
+            yield
+
+    @contextmanager
+    def read_after(self, prepare):
+        """
+        Выполняет prepare() под блокировкой записи и без разрыва переходит к чтению:
+        так сохранение сначала догружает отложенные объекты, а затем обходит согласованное
+        состояние, не мешая другим читателям. Если поток уже читает, prepare не вызывается.
+        """
+        me = threading.get_ident()
+        if me in self._readers and self._writer != me:
+            self.acquire_read()
+        else:
+            self.acquire_write()
+            try:
+                prepare()
+                self.acquire_read()
+            finally:
+                self.release_write()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+
+store_lock = RWLock()
@@ -0,0 +1,12 @@
+# Постраничный режим хранения: объекты класса лежат во внешнем хранилище (см. storage.py),
+# а в _instances остается ограниченный кеш горячих объектов
+
+
+def paged_source(cls):
+    """
+    Возвращает подключенный к классу источник в постраничном режиме или None.
+    Такой источник сам отвечает на точечные запросы (по пользователю, жилью, пересечению
+    периодов), поэтому для них не нужно догружать в память все объекты класса.
+    """
+    source = cls._lazy
+    return source if source is not None and source.paged else None
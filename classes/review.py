@@ -1,64 +1,211 @@
 from .user import User
 from .house import Housing
+from .events import emit
+from .paging import paged_source
+from .locking import store_lock
 
 class InvalidRatingError(ValueError):
     """Собственное исключение для недопустимого рейтинга."""
     pass
 
 class Review:
-    _instances = {}  # Внутриклассовое хранилище: {review_id: review_object}
+    # Ссылки на пользователя и жилье хранятся как ID и разрешаются через get при обращении
+    __slots__ = ('review_id', 'user_id', 'housing_id', 'rating', 'comment', '__weakref__')
+    _instances = {}  # Внутриклассовое хранилище (или кеш, см. storage.py): {review_id: review_object}
+    _lazy = None  # Отложенный источник объектов (снимок или база), см. Manager.load_snapshot
+    _by_user = {}  # Индекс: {user_id: {review_id: review_object}}
+    _by_housing = {}  # Индекс: {housing_id: {review_id: review_object}}
 
     def __init__(self, review_id: int, user: User, housing: Housing, rating: int, comment: str):
         if not isinstance(review_id, int) or review_id <= 0:
             raise ValueError("ID отзыва должен быть положительным числом.")
         if not isinstance(user, User) or not isinstance(housing, Housing):
              raise TypeError("user и housing должны быть объектами своих классов.")
-        if not (1 <= rating <= 5):
-            raise InvalidRatingError("Рейтинг должен быть в диапазоне от 1 до 5.")
+        if not isinstance(rating, int) or not (1 <= rating <= 5):
+            raise InvalidRatingError("Рейтинг должен быть целым числом в диапазоне от 1 до 5.")
 
         self.review_id = review_id
-        self.user = user
-        self.housing = housing
+        self.user_id = user.user_id
+        self.housing_id = housing.housing_id
         self.rating = rating
         self.comment = comment
 
+    @property
+    def user(self) -> User:
+        """Автор отзыва (None, если пользователь удален)."""
+        return User.get(self.user_id)
+
+    @property
+    def housing(self) -> Housing:
+        """Жилье, о котором отзыв (None, если жилье удалено)."""
+        return Housing.get(self.housing_id)
+
     @classmethod
     def create(cls, review_id: int, user: User, housing: Housing, rating: int, comment: str):
         """CREATE: Создает объект отзыва и сохраняет его."""
-        if review_id in cls._instances:
-            raise ValueError(f"Отзыв с ID {review_id} уже существует.")
+        with store_lock.write():
+            if cls.get(review_id) is not None:
+                raise ValueError(f"Отзыв с ID {review_id} уже существует.")
         
-        review = cls(review_id, user, housing, rating, comment)
-        cls._instances[review_id] = review
-        return review
+            review = cls(review_id, user, housing, rating, comment)
+            cls._check_refs(review.user_id, review.housing_id)
+            cls._register(review)
+            emit('create', review)
+            return review
+
+    @classmethod
+    def create_many(cls, rows):
+        """
+        CREATE: Пакетно создает отзывы из словарей с аргументами create.
+        Пачка применяется целиком или отклоняется целиком: ID проверяются сразу для всех строк.
+        """
+        reviews = [cls(**row) for row in rows]
+        ids = {r.review_id for r in reviews}
+        if len(ids) != len(reviews):
+            raise ValueError("В пакете есть отзывы с повторяющимися ID.")
+        with store_lock.write():
+            for review in reviews:
+                cls._check_refs(review.user_id, review.housing_id)
+            source = paged_source(cls)
+            if source is not None:
+                taken = source.existing(ids)
+            else:
+                cls._materialize()
+                taken = ids & cls._instances.keys()
+            if taken:
+                raise ValueError(f"Отзывы с ID {sorted(taken)[:10]} уже существуют.")
+            for review in reviews:
+                cls._register(review)
+            for review in reviews:
+                emit('create', review)
+            return reviews
+
+    @staticmethod
+    def _check_refs(user_id: int, housing_id: int):
+        """Проверяет, что пользователь и жилье не удалены из хранилищ (например, другим потоком)."""
+        if User.get(user_id) is None:
+            raise ValueError(f"Пользователь с ID {user_id} удален, создание отзыва невозможно.")
+        if Housing.get(housing_id) is None:
+            raise ValueError(f"Жилье с ID {housing_id} удалено, создание отзыва невозможно.")
+
+    @classmethod
+    def _register(cls, review):
+        """Помещает проверенный отзыв в хранилище и индексы."""
+        cls._instances[review.review_id] = review
+        cls._by_user.setdefault(review.user_id, {})[review.review_id] = review
+        cls._by_housing.setdefault(review.housing_id, {})[review.review_id] = review
+        if paged_source(cls) is None:
+            # В постраничном режиме сюда приходит и каждая загрузка отзыва в кеш; оценки там считает база
+            review.housing._ratings[review.rating - 1] += 1
+
+    @classmethod
+    def _unregister(cls, review):
+        """Убирает отзыв из вторичных индексов (при удалении или вытеснении из кеша)."""
+        cls._unindex(cls._by_user, review.user_id, review.review_id)
+        cls._unindex(cls._by_housing, review.housing_id, review.review_id)
 
     @classmethod
     def get(cls, review_id: int):
         """READ: Находит отзыв по ID."""
-        return cls._instances.get(review_id)
+        obj = cls._instances.get(review_id)
+        if obj is None and cls._lazy is not None:
+            with store_lock.fill():
+                obj = cls._instances.get(review_id)
+                if obj is None and cls._lazy is not None:
+                    obj = cls._lazy.load(review_id)
+        return obj
 
     def update(self, rating: int = None, comment: str = None):
         """UPDATE: Обновляет данные конкретного отзыва."""
-        if rating is not None:
-            if not (1 <= rating <= 5):
-                raise InvalidRatingError("Рейтинг должен быть в диапазоне от 1 до 5.")
-            self.rating = rating
-        if comment is not None:
-            self.comment = comment
+        with store_lock.write():
+            # get возвращает в кеш объект, вытесненный из него; оценка удаленного отзыва уже
+            # вычтена из гистограммы жилья, поэтому менять его нельзя
+            if self.__class__.get(self.review_id) is not self:
+                raise ValueError(f"Отзыв с ID {self.review_id} удален, изменение невозможно.")
+            if rating is not None:
+                if not isinstance(rating, int) or not (1 <= rating <= 5):
+                    raise InvalidRatingError("Рейтинг должен быть целым числом в диапазоне от 1 до 5.")
+                if paged_source(self.__class__) is None:
+                    ratings = self.housing._ratings
+                    ratings[self.rating - 1] -= 1
+                    ratings[rating - 1] += 1
+                self.rating = rating
+            if comment is not None:
+                self.comment = comment
+            emit('update', self, {k: v for k, v in (('rating', rating), ('comment', comment)) if v is not None})
 
     def delete(self):
         """DELETE: Удаляет отзыв. Каскадное удаление не требуется."""
-        del self.__class__._instances[self.review_id]
+        with store_lock.write():
+            cls = self.__class__
+            # get возвращает в кеш объект, вытесненный из него; устаревшая ссылка не должна
+            # удалять новый отзыв с тем же ID и менять гистограмму по своей старой оценке
+            if cls.get(self.review_id) is not self:
+                raise ValueError(f"Отзыв с ID {self.review_id} уже удален.")
+            del cls._instances[self.review_id]
+            cls._unregister(self)
+            if paged_source(cls) is None:
+                self.housing._ratings[self.rating - 1] -= 1
+            emit('delete', self)
+
+    @staticmethod
+    def _unindex(index: dict, key: int, item_id: int):
+        """Убирает запись из вторичного индекса, удаляя опустевшие корзины."""
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(item_id, None)
+            if not bucket:
+                del index[key]
+
+    @classmethod
+    def for_user(cls, user: User):
+        """Возвращает все отзывы пользователя через индекс, без обхода хранилища."""
+        source = paged_source(cls)
+        if source is not None:
+            return source.load_many(source.ids_by('user_id', user.user_id))
+        cls._materialize()
+        return list(cls._by_user.get(user.user_id, {}).values())
+
+    @classmethod
+    def for_housing(cls, housing: Housing):
+        """Возвращает все отзывы жилья через индекс, без обхода хранилища."""
+        source = paged_source(cls)
+        if source is not None:
+            return source.load_many(source.ids_by('housing_id', housing.housing_id))
+        cls._materialize()
+        return list(cls._by_housing.get(housing.housing_id, {}).values())
 
     @classmethod
     def get_all(cls):
         """Вспомогательный метод для получения всех экземпляров."""
+        source = paged_source(cls)
+        if source is not None:
+            return source.objects()
+        cls._materialize()
         return list(cls._instances.values())
 
+    @classmethod
+    def _materialize(cls):
+        """
+        Догружает все еще не созданные объекты из отложенного источника, если он подключен.
+        Источник постраничного режима не догружается: запросы к нему выполняет он сам.
+        """
+        if cls._lazy is not None and not cls._lazy.paged:
+            with store_lock.fill():
+                if cls._lazy is not None and not cls._lazy.paged:
+                    cls._lazy.load_all()
+
     @classmethod
     def clear_all(cls):
         """Вспомогательный метод для очистки хранилища."""
-        cls._instances.clear()
+        with store_lock.write():
+            cls._instances.clear()
+            cls._lazy = None
+            cls._by_user.clear()
+            cls._by_housing.clear()
+            for house in Housing._instances.values():
+                house._ratings = [0] * 5  # Гистограммы оценок строились по удаленным отзывам
+            emit('clear', cls)
 
     def __str__(self):
         return f"Отзыв {self.rating}/5 от {self.user.name}: {self.comment}"
\ No newline at end of file
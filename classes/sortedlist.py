@@ -0,0 +1,111 @@
+# Отсортированный список из корзин для индексов, которые меняются по одному элементу
+import bisect
+from itertools import chain
+
+
+class SortedList:
+    """
+    Отсортированная последовательность, разбитая на корзины ограниченного размера.
+    Вставка и удаление сдвигают элементы только одной корзины, поэтому стоят O(log n + LOAD),
+    а не O(n), как у bisect.insort в сплошном списке; пакет элементов сливается за один проход
+    (update). Позиционный поиск (bisect_left) и срез (islice) проходят по длинам корзин.
+    """
+    LOAD = 1000  # Корзина делится пополам, когда в ней становится больше 2 * LOAD элементов
+
+    def __init__(self, values=()):
+        self._lists = []  # Корзины: отсортированные списки, идущие друг за другом
+        self._maxes = []  # Последний элемент каждой корзины
+        self._len = 0
+        self.update(values)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable(self._lists)
+
+    def __reversed__(self):
+        return chain.from_iterable(reversed(lst) for lst in reversed(self._lists))
+
+    def __repr__(self):
+        return f"SortedList({list(self)!r})"
+
+    def add(self, value):
+        """Вставляет элемент, сохраняя порядок."""
+        if not self._maxes:
+            self._lists.append([value])
+            self._maxes.append(value)
+        else:
+            pos = bisect.bisect_left(self._maxes, value)
+            if pos == len(self._maxes):
+                pos -= 1
+                self._lists[pos].append(value)
+                self._maxes[pos] = value
+            else:
+                bisect.insort(self._lists[pos], value)
+            if len(self._lists[pos]) > 2 * self.LOAD:
+                lst = self._lists[pos]
+                self._lists[pos:pos + 1] = [lst[:self.LOAD], lst[self.LOAD:]]
+                self._maxes[pos:pos + 1] = [lst[self.LOAD - 1], lst[-1]]
+        self._len += 1
+
+    def discard(self, value) -> bool:
+        """Удаляет элемент, если он есть; возвращает True, если элемент был удален."""
+        pos = bisect.bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return False
+        lst = self._lists[pos]
+        i = bisect.bisect_left(lst, value)
+        if lst[i] != value:
+            return False
+        del lst[i]
+        self._len -= 1
+        if lst:
+            self._maxes[pos] = lst[-1]
+        else:
+            del self._lists[pos], self._maxes[pos]
+        return True
+
+    def update(self, values):
+        """
+        Добавляет пакет элементов. Крупный относительно списка пакет сливается с ним одной
+        сортировкой (сортировка слиянием находит уже упорядоченные участки), мелкий вставляется
+        поэлементно.
+        """
+        values = list(values)
+        if len(values) * 8 < self._len:
+            for value in values:
+                self.add(value)
+            return
+        values.sort()
+        merged = sorted(chain(self, values)) if self._len else values
+        self._lists = [merged[i:i + self.LOAD] for i in range(0, len(merged), self.LOAD)]
+        self._maxes = [lst[-1] for lst in self._lists]
+        self._len = len(merged)
+
+    def clear(self):
+        self._lists.clear()
+        self._maxes.clear()
+        self._len = 0
+
+    def bisect_left(self, value) -> int:
+        """Позиция, на которую встал бы value: число элементов, меньших value."""
+        pos = bisect.bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return self._len
+        return sum(map(len, self._lists[:pos])) + bisect.bisect_left(self._lists[pos], value)
+
+    def islice(self, start: int, stop: int, reverse: bool = False):
+        """Итератор по элементам с позициями [start, stop), в прямом или обратном порядке."""
+        parts = []
+        offset = 0
+        for lst in self._lists:
+            end = offset + len(lst)
+            if end > start and offset < stop:
+                parts.append(lst[max(start - offset, 0):stop - offset] if start > offset or stop < end else lst)
+            if end >= stop:
+                break
+            offset = end
+        if reverse:
+            return chain.from_iterable(reversed(part) for part in reversed(parts))
+        return chain.from_iterable(parts)
@@ -1,9 +1,15 @@
+from .events import emit
+from .paging import paged_source
+from .locking import store_lock
+
 class UserDataError(Exception):
     """Собственное исключение для ошибок в данных пользователя."""
     pass
 
 class User:
-    _instances = {}  # Внутриклассовое хранилище: {user_id: user_object}
+    __slots__ = ('user_id', 'name', 'contact_info', '__weakref__')
+    _instances = {}  # Внутриклассовое хранилище (или кеш, см. storage.py): {user_id: user_object}
+    _lazy = None  # Отложенный источник объектов (снимок или база), см. Manager.load_snapshot
 
     def __init__(self, user_id: int, name: str, contact_info: str):
         # Проверки корректности данных для одного объекта
@@ -21,51 +27,123 @@ class User:
     @classmethod
     def create(cls, user_id: int, name: str, contact_info: str):
         """CREATE: Создает объект пользователя и сохраняет его в хранилище класса."""
-        if user_id in cls._instances:
-            raise ValueError(f"Пользователь с ID {user_id} уже существует.")
+        with store_lock.write():
+            if cls.get(user_id) is not None:
+                raise ValueError(f"Пользователь с ID {user_id} уже существует.")
         
-        user = cls(user_id, name, contact_info)  # Вызов __init__ для валидации
-        cls._instances[user_id] = user
-        return user
+            user = cls(user_id, name, contact_info)  # Вызов __init__ для валидации
+            cls._register(user)
+            emit('create', user)
+            return user
+
+    @classmethod
+    def create_many(cls, rows):
+        """
+        CREATE: Пакетно создает пользователей из словарей с аргументами create.
+        Пачка применяется целиком или отклоняется целиком: ID проверяются сразу для всех строк.
+        """
+        users = [cls(**row) for row in rows]
+        ids = {u.user_id for u in users}
+        if len(ids) != len(users):
+            raise ValueError("В пакете есть пользователи с повторяющимися ID.")
+        with store_lock.write():
+            source = paged_source(cls)
+            if source is not None:
+                taken = source.existing(ids)
+            else:
+                cls._materialize()
+                taken = ids & cls._instances.keys()
+            if taken:
+                raise ValueError(f"Пользователи с ID {sorted(taken)[:10]} уже существуют.")
+            for user in users:
+                cls._register(user)
+            for user in users:
+                emit('create', user)
+            return users
+
+    @classmethod
+    def _register(cls, user):
+        """Помещает проверенное пользователя в хранилище."""
+        cls._instances[user.user_id] = user
+
+    @classmethod
+    def _unregister(cls, user):
+        """Вторичных индексов у пользователей нет (метод нужен для вытеснения из кеша)."""
+        pass
 
     @classmethod
     def get(cls, user_id: int):
         """READ: Находит пользователя по ID."""
-        return cls._instances.get(user_id)
+        obj = cls._instances.get(user_id)
+        if obj is None and cls._lazy is not None:
+            with store_lock.fill():
+                obj = cls._instances.get(user_id)
+                if obj is None and cls._lazy is not None:
+                    obj = cls._lazy.load(user_id)
+        return obj
 
     def update(self, name: str = None, contact_info: str = None):
         """UPDATE: Обновляет данные конкретного пользователя."""
-        if name is not None:
-            self.name = name
-        if contact_info is not None:
-            self.contact_info = contact_info
+        with store_lock.write():
+            # Удаленный пользователь (ссылка, оставшаяся у другого потока) не меняется, и событие
+            # для него не отправляется: иначе журнал записал бы изменение после удаления
+            if self.__class__.get(self.user_id) is not self:
+                raise UserDataError(f"Пользователь с ID {self.user_id} удален, изменение невозможно.")
+            if name is not None:
+                self.name = name
+            if contact_info is not None:
+                self.contact_info = contact_info
+            emit('update', self, {k: v for k, v in (('name', name), ('contact_info', contact_info)) if v is not None})
 
     def delete(self):
         """DELETE: Удаляет пользователя и все связанные с ним бронирования и отзывы."""
         from .booking import Booking
         from .review import Review
 
-        # Каскадное удаление: сначала удаляем зависимые объекты
-        for booking in list(Booking._instances.values()):
-            if booking.user.user_id == self.user_id:
+        with store_lock.write():
+            # get возвращает в кеш объект, вытесненный из него; устаревшая ссылка не должна
+            # удалять пересозданного пользователя вместе с его бронированиями
+            if self.__class__.get(self.user_id) is not self:
+                raise UserDataError(f"Пользователь с ID {self.user_id} уже удален.")
+
+            # Каскадное удаление: сначала удаляем зависимые объекты
+            for booking in Booking.for_user(self):
                 booking.delete()
         
-        for review in list(Review._instances.values()):
-            if review.user.user_id == self.user_id:
+            for review in Review.for_user(self):
                 review.delete()
         
-        # Удаляем сам объект пользователя
-        del self.__class__._instances[self.user_id]
+            # Удаляем сам объект пользователя
+            del self.__class__._instances[self.user_id]
+            emit('delete', self)
 
     @classmethod
     def get_all(cls):
         """Вспомогательный метод для получения всех экземпляров."""
+        source = paged_source(cls)
+        if source is not None:
+            return source.objects()
+        cls._materialize()
         return list(cls._instances.values())
+
+    @classmethod
+    def _materialize(cls):
+        """
+        Догружает все еще не созданные объекты из отложенного источника, если он подключен.
+        Источник постраничного режима не догружается: запросы к нему выполняет он сам.
+        """
+        if cls._lazy is not None and not cls._lazy.paged:
+            with store_lock.fill():
+                if cls._lazy is not None and not cls._lazy.paged:
+                    cls._lazy.load_all()
         
     @classmethod
     def clear_all(cls):
         """Вспомогательный метод для очистки хранилища (нужен для загрузки из файла)."""
-        cls._instances.clear()
+        with store_lock.write():
+            cls._instances.clear()
+            cls._lazy = None
+            emit('clear', cls)
 
     def __str__(self):
         return f"Пользователь: {self.name} (ID: {self.user_id})"
\ No newline at end of file
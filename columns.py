@@ -0,0 +1,346 @@
+# Колоночное хранилище в памяти: поля объектов лежат в параллельных массивах, а объекты
+# строятся по запросу через LRU-кеш постраничного режима (см. storage.py)
+#
+# Таблица класса — отсортированный массив ID и колонки той же длины: числа (ID ссылок,
+# цены, почтовые индексы, оценки, порядковые номера дней) — в array, строки — в списках.
+# Города и улицы интернированы в Address, поэтому колонка хранит ссылки на общие строки.
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from classes import events
+from classes.locking import store_lock
+from records import ENTITIES, KINDS, ID_FIELDS, materialize_all
+from storage import PagedBackend
+
+# Колонки таблиц: (поле, typecode массива или None для списка строк)
+SCHEMA = {
+    'users': (('name', None), ('contact_info', None)),
+    'housings': (('price_per_night', 'd'), ('postal_code', 'q'), ('city', None), ('street', None),
+                 ('building_number', None), ('description', None)),
+    'bookings': (('user_id', 'q'), ('housing_id', 'q'), ('start', 'i'), ('end', 'i')),
+    'reviews': (('user_id', 'q'), ('housing_id', 'q'), ('rating', 'b'), ('comment', None)),
+}
+
+
+def _values(kind: str, obj) -> tuple:
+    """Значения колонок объекта в порядке SCHEMA[kind]."""
+    if kind == 'users':
+        return (obj.name, obj.contact_info)
+    if kind == 'housings':
+        loc = obj.location
+        return (obj.price_per_night, loc.postal_code or 0, loc.city, loc.street, loc.building_number, obj.description)
+    if kind == 'bookings':
+        return (obj.user_id, obj.housing_id) + obj._span
+    return (obj.user_id, obj.housing_id, obj.rating, obj.comment)
+
+
+def _record(kind: str, item_id: int, values: tuple) -> dict:
+    """Запись строки в формате records.to_record (даты бронирования — объекты date)."""
+    if kind == 'users':
+        return {'user_id': item_id, 'name': values[0], 'contact_info': values[1]}
+    if kind == 'housings':
+        price, postal_code, city, street, building_number, description = values
+        return {'housing_id': item_id, 'location': {'city': city, 'street': street, 'building_number': building_number,
+                                                    'postal_code': postal_code or None},
+                'price_per_night': price, 'description': description}
+    if kind == 'bookings':
+        user_id, housing_id, start, end = values
+        return {'booking_id': item_id, 'user_id': user_id, 'housing_id': housing_id,
+                'start_date': date.fromordinal(start), 'end_date': date.fromordinal(end)}
+    user_id, housing_id, rating, comment = values
+    return {'review_id': item_id, 'user_id': user_id, 'housing_id': housing_id, 'rating': rating, 'comment': comment}
+
+
+class _Table:
+    """
+    Строки одного класса: ID в отсортированном массиве ids и параллельные колонки.
+    Строка ищется бинарным поиском по ids; вставка и удаление сдвигают хвосты колонок,
+    а строки, добавляемые по возрастанию ID (загрузка из файла), дописываются в конец.
+    """
+
+    def __init__(self, schema: tuple):
+        self._schema = schema
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def find(self, item_id: int) -> int:
+        """Номер строки с указанным ID или -1."""
+        i = bisect_left(self.ids, item_id)
+        return i if i < len(self.ids) and self.ids[i] == item_id else -1
+
+    def row(self, i: int) -> tuple:
+        return tuple(column[i] for column in self.columns)
+
+    def put(self, item_id: int, values: tuple):
+        """Вставляет или заменяет строку; возвращает прежние значения или None."""
+        i = bisect_left(self.ids, item_id)
+        if i < len(self.ids) and self.ids[i] == item_id:
+            old = self.row(i)
+            for column, value in zip(self.columns, values):
+                column[i] = value
+            return old
+        self.ids.insert(i, item_id)
+        for column, value in zip(self.columns, values):
+            column.insert(i, value)
+        return None
+
+    def remove(self, item_id: int):
+        """Удаляет строку; возвращает ее значения или None, если строки нет."""
+        i = self.find(item_id)
+        if i < 0:
+            return None
+        old = self.row(i)
+        del self.ids[i]
+        for column in self.columns:
+            del column[i]
+        return old
+
+    def clear(self):
+        self.ids = array('q')
+        self.columns = [array(code) if code else [] for _, code in self._schema]
+
+
+def _index_add(index: dict, key: int, item_id: int):
+    ids = index.get(key)
+    if ids is None:
+        index[key] = array('q', (item_id,))
+    else:
+        insort(ids, item_id)
+
+
+def _index_remove(index: dict, key: int, item_id: int):
+    ids = index.get(key)
+    if ids is not None:
+        i = bisect_left(ids, item_id)
+        if i < len(ids) and ids[i] == item_id:
+            del ids[i]
+        if not ids:
+            del index[key]
+
+
+class ColumnarBackend(PagedBackend):
+    """
+    Компактное хранилище в памяти. При подключении (attach) текущее состояние переносится
+    в колонки таблиц, а в _instances классов остается кеш на cache_size объектов: get строит
+    объект из строки таблицы при промахе, get_all и операции над всем хранилищем получают
+    объекты пачками на время обхода, а изменения объектов сразу записываются в колонки.
+    Бронирования и отзывы пользователя или жилья, пересечение периодов и оценки жилья
+    находятся по индексам из массивов ID; поиск жилья, лучшее и свободное жилье перебирают
+    колонки таблицы жилья. При отключении все объекты снова создаются в памяти.
+    CRUD-методы классов работают так же, как в режиме словарей.
+    """
+    name = 'columnar'
+
+    def __init__(self, cache_size: int = 10_000):
+        super().__init__(cache_size)
+        self._lock = threading.RLock()  # Источники классов читают таблицы без блокировки хранилищ
+        self._attached = False
+        self._tables = {kind: _Table(SCHEMA[kind]) for kind in ENTITIES}
+        self._by_user = {'bookings': {}, 'reviews': {}}  # {kind: {user_id: array ID}}
+        self._by_housing = {'reviews': {}}  # Бронирования жилья находятся по календарю
+        # Календарь: {housing_id: (начала, окончания, ID бронирований)}, отсортирован по началу;
+        # периоды одного жилья не пересекаются, поэтому он отсортирован и по окончанию
+        self._calendar = {}
+
+    @staticmethod
+    def decode(record: dict) -> dict:
+        return record  # Записи строятся из колонок при каждом чтении
+
+    def attach(self):
+        with store_lock.write():
+            materialize_all()
+            with self._lock:
+                for kind, cls in ENTITIES.items():
+                    for obj in cls.get_all():
+                        self._put(kind, obj)
+            self._start_paging()
+            self._attached = True
+
+    def detach(self):
+        """Создает все объекты в памяти и освобождает таблицы."""
+        if not self._attached:
+            return
+        with store_lock.write():
+            self.materialize()
+            events.unsubscribe(self._on_change)
+            with self._lock:
+                for kind in ENTITIES:
+                    self._clear(kind)
+            self._attached = False
+
+    def _on_change(self, op: str, obj, changes: dict = None):
+        with self._lock:
+            if op == 'clear':
+                self._clear(KINDS[obj])
+                self._cleared(obj)
+                return
+            kind = KINDS[type(obj)]
+            if op == 'delete':
+                old = self._tables[kind].remove(getattr(obj, ID_FIELDS[kind]))
+                if old is not None:
+                    self._index(kind, getattr(obj, ID_FIELDS[kind]), old, False)
+            elif op == 'create' or self._tables[kind].find(getattr(obj, ID_FIELDS[kind])) >= 0:
+                self._put(kind, obj)  # Изменение удаленного объекта строку не создает
+
+    def _put(self, kind: str, obj):
+        item_id = getattr(obj, ID_FIELDS[kind])
+        values = _values(kind, obj)
+        old = self._tables[kind].put(item_id, values)
+        if old is not None:
+            self._index(kind, item_id, old, False)
+        self._index(kind, item_id, values, True)
+
+    def _index(self, kind: str, item_id: int, values: tuple, add: bool):
+        """Добавляет строку во вторичные индексы (add=True) или убирает из них."""
+        if kind == 'bookings':
+            user_id, housing_id, start, end = values
+            (_index_add if add else _index_remove)(self._by_user[kind], user_id, item_id)
+            (self._span_add if add else self._span_remove)(housing_id, start, end, item_id)
+        elif kind == 'reviews':
+            user_id, housing_id = values[:2]
+            (_index_add if add else _index_remove)(self._by_user[kind], user_id, item_id)
+            (_index_add if add else _index_remove)(self._by_housing[kind], housing_id, item_id)
+
+    def _span_add(self, housing_id: int, start: int, end: int, booking_id: int):
+        starts, ends, ids = self._calendar.setdefault(housing_id, (array('i'), array('i'), array('q')))
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, end)
+        ids.insert(i, booking_id)
+
+    def _span_remove(self, housing_id: int, start: int, end: int, booking_id: int):
+        calendar = self._calendar.get(housing_id)
+        if calendar is None:
+            return
+        starts, ends, ids = calendar
+        i = bisect_left(starts, start)
+        while i < len(starts) and starts[i] == start:
+            if ids[i] == booking_id:
+                del starts[i], ends[i], ids[i]
+                break
+            i += 1
+        if not ids:
+            del self._calendar[housing_id]
+
+    def _clear(self, kind: str):
+        self._tables[kind].clear()
+        if kind == 'bookings':
+            self._calendar.clear()
+        for index in (self._by_user, self._by_housing):
+            if kind in index:
+                index[kind].clear()
+
+    def fetch(self, kind: str, item_id: int):
+        with self._lock:
+            table = self._tables[kind]
+            i = table.find(item_id)
+            return None if i < 0 else _record(kind, item_id, table.row(i))
+
+    def fetch_many(self, kind: str, ids: list) -> list:
+        with self._lock:
+            table = self._tables[kind]
+            rows = []
+            for item_id in ids:
+                i = table.find(item_id)
+                if i >= 0:
+                    rows.append((item_id, _record(kind, item_id, table.row(i))))
+            return rows
+
+    def scan(self, kind: str):
+        """Пары (id, запись) всех строк таблицы по возрастанию ID (строятся по мере обхода)."""
+        after = 0
+        while True:
+            rows = self.scan_after(kind, after, 10_000)
+            yield from rows
+            if not rows:
+                return
+            after = rows[-1][0]
+
+    def scan_after(self, kind: str, after: int, limit: int) -> list:
+        """Пары (id, запись) не более чем limit строк с ID больше after по возрастанию ID."""
+        with self._lock:
+            table = self._tables[kind]
+            lo = bisect_right(table.ids, after)
+            return [(table.ids[i], _record(kind, table.ids[i], table.row(i)))
+                    for i in range(lo, min(lo + limit, len(table)))]
+
+    def count(self, kind: str) -> int:
+        return len(self._tables[kind])
+
+    def ids_by(self, kind: str, field: str, value: int) -> list:
+        with self._lock:
+            if field == 'user_id':
+                return list(self._by_user[kind].get(value, ()))
+            if kind == 'bookings':
+                return sorted(self._calendar.get(value, ((), (), ()))[2])
+            return list(self._by_housing[kind].get(value, ()))
+
+    def existing(self, kind: str, ids) -> set:
+        with self._lock:
+            table = self._tables[kind]
+            return {item_id for item_id in ids if table.find(item_id) >= 0}
+
+    def conflicts(self, housing_id: int, start: int, end: int, exclude: int = None) -> bool:
+        # Как и в календаре в памяти, достаточно проверить последний период, начавшийся раньше end
+        with self._lock:
+            calendar = self._calendar.get(housing_id)
+            if calendar is None:
+                return False
+            starts, ends, ids = calendar
+            i = bisect_left(starts, end) - 1
+            if i >= 0 and ids[i] == exclude:
+                i -= 1
+            return i >= 0 and ends[i] > start
+
+    def ratings(self, housing_id: int) -> list:
+        """Гистограмма оценок отзывов жилья: [число оценок 1, ..., число оценок 5]."""
+        counts = [0] * 5
+        with self._lock:
+            table = self._tables['reviews']
+            ratings = table.columns[2]
+            for review_id in self._by_housing['reviews'].get(housing_id, ()):
+                counts[ratings[table.find(review_id)] - 1] += 1
+        return counts
+
+    def _housings(self, city: str = None):
+        """Пары (ID, цена) жилья города city (или всего жилья) по возрастанию ID."""
+        table = self._tables['housings']
+        prices, cities = table.columns[0], table.columns[2]
+        if city is None:
+            return zip(table.ids, prices)
+        return ((housing_id, price) for housing_id, price, c in zip(table.ids, prices, cities) if c == city)
+
+    def search(self, city: str = None, street: str = None, min_price=None, max_price=None,
+               order_by: str = None, limit: int = None) -> list:
+        """ID жилья для Housing.search в том же порядке: по цене (и ID) или по ID."""
+        with self._lock:
+            table = self._tables['housings']
+            found = [(price, housing_id) for housing_id, price, c, s in
+                     zip(table.ids, table.columns[0], table.columns[2], table.columns[3])
+                     if (city is None or c == city) and (street is None or s == street)
+                     and (min_price is None or price >= min_price) and (max_price is None or price <= max_price)]
+        if order_by is not None:
+            found.sort(reverse=order_by == '-price')
+        ids = [housing_id for _, housing_id in found]
+        return ids if limit is None else ids[:max(limit, 0)]
+
+    def best_rated(self, city: str, n: int, min_reviews: int) -> list:
+        """ID жилья для Housing.best_rated: по средней оценке, затем по числу отзывов."""
+        with self._lock:
+            rated = []
+            for housing_id, _ in self._housings(city):
+                counts = self.ratings(housing_id)
+                total = sum(counts)
+                if total >= min_reviews:
+                    rated.append((sum(k * c for k, c in enumerate(counts, 1)) / total, total, -housing_id))
+        return [-key[2] for key in heapq.nlargest(max(n, 0), rated)]
+
+    def free_housings(self, start: int, end: int, city: str = None) -> list:
+        """ID жилья без бронирований, пересекающих [start, end)."""
+        with self._lock:
+            return [housing_id for housing_id, _ in self._housings(city)
+                    if not self.conflicts(housing_id, start, end)]
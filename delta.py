@@ -0,0 +1,164 @@
+# Отслеживание изменений хранилищ и применение разностей (дельт) между выгрузками
+from classes import events
+from classes.locking import store_lock
+from records import ENTITIES, KINDS, ID_FIELDS, to_record, to_kwargs, recount_ratings
+
+# Поля, которые можно изменить через update; разница в остальных полях означает,
+# что объект был удален и создан заново
+MUTABLE = {'users': ('name', 'contact_info'), 'housings': ('price_per_night', 'description'),
+           'bookings': ('start_date', 'end_date'), 'reviews': ('rating', 'comment')}
+
+
+class ChangeTracker:
+    """
+    Отслеживает объекты, измененные операциями create/update/delete/clear_all с момента
+    последней выгрузки. Для каждого класса хранится {id: объект} (None — объект удален)
+    и признак полной очистки хранилища, поэтому размер дельты зависит только от числа
+    измененных объектов, а не от объема данных.
+    """
+
+    def __init__(self):
+        self.cleared = set()  # Классы (kind), хранилища которых очищались
+        self.changed = {kind: {} for kind in ENTITIES}
+        events.subscribe(self._on_change)
+
+    def _on_change(self, op: str, obj, changes: dict = None):
+        if op == 'clear':
+            kind = KINDS[obj]
+            self.cleared.add(kind)
+            self.changed[kind].clear()
+            return
+        kind = KINDS[type(obj)]
+        self.changed[kind][getattr(obj, ID_FIELDS[kind])] = None if op == 'delete' else obj
+
+    def __len__(self):
+        return sum(map(len, self.changed.values())) + len(self.cleared)
+
+    def take(self):
+        """Возвращает накопленные изменения и начинает отслеживание заново (вызывать под блокировкой)."""
+        taken = (self.cleared, self.changed)
+        self.cleared, self.changed = set(), {kind: {} for kind in ENTITIES}
+        return taken
+
+    def restore(self, taken):
+        """Возвращает изменения, полученные через take, если выгрузку не удалось записать."""
+        cleared, changed = taken
+        for kind, items in changed.items():
+            if kind in self.cleared:
+                continue  # Хранилище очищено позже: старые изменения уже не нужны
+            if kind in cleared:
+                self.cleared.add(kind)
+            for item_id, obj in items.items():
+                self.changed[kind].setdefault(item_id, obj)
+
+    def mark_all(self):
+        """
+        Отмечает все объекты хранилищ как созданные — после подмены состояния без событий
+        create (например, подключения снимка), чтобы следующая дельта содержала все записи.
+        Вызывать под блокировкой хранилищ после догрузки отложенных объектов.
+        """
+        for kind, cls in ENTITIES.items():
+            self.changed[kind].update((getattr(obj, ID_FIELDS[kind]), obj) for obj in cls.get_all())
+
+    def close(self):
+        """Отключает отслеживание."""
+        events.unsubscribe(self._on_change)
+
+
+def collect(taken) -> dict:
+    """
+    Превращает изменения из ChangeTracker.take в дельту:
+    {'clear': [kind, ...], kind: [запись, ...], 'deleted': {kind: [id, ...]}}.
+    """
+    cleared, changed = taken
+    delta = {'clear': [kind for kind in ENTITIES if kind in cleared], 'deleted': {}}
+    for kind, items in changed.items():
+        delta[kind] = [to_record(obj) for obj in items.values() if obj is not None]
+        delta['deleted'][kind] = [item_id for item_id, obj in items.items() if obj is None]
+    return delta
+
+
+def apply(delta: dict):
+    """
+    Применяет дельту к текущему состоянию: очищает перечисленные хранилища, удаляет
+    объекты (зависимые раньше основных), затем создает новые объекты и обновляет
+    измененные. Возвращает счетчики примененных записей.
+    Дельта применяется целиком или не применяется: если операция отклонена (например,
+    новые даты бронирования пересекаются с другим), выполненные шаги отменяются
+    (см. _rollback) и исключение передается вызвавшему.
+    """
+    counters = {'created': 0, 'updated': 0, 'deleted': 0, 'skipped': 0}
+    undo = []  # Шаги для отката в порядке выполнения: (op, объект или класс, данные)
+
+    def record(op: str, obj, changes: dict = None):
+        # Созданные и удаленные объекты (в том числе каскадом) видны только через события;
+        # обновления и очистки apply записывает сам, вместе с прежним состоянием
+        if op in ('create', 'delete'):
+            undo.append((op, obj, None))
+
+    with store_lock.write():
+        events.subscribe(record)
+        try:
+            for kind in delta.get('clear', []):
+                cls = ENTITIES[kind]
+                undo.append(('clear', cls, list(cls.get_all())))  # В постраничном режиме get_all читает базу при обходе
+                cls.clear_all()
+            for kind in reversed(list(ENTITIES)):
+                cls = ENTITIES[kind]
+                for item_id in delta.get('deleted', {}).get(kind, []):
+                    obj = cls.get(item_id)
+                    if obj is not None:
+                        obj.delete()
+                        counters['deleted'] += 1
+            for kind, cls in ENTITIES.items():
+                for rec in delta.get(kind, []):
+                    obj = cls.get(rec[ID_FIELDS[kind]])
+                    if obj is not None:
+                        current = to_record(obj)
+                        if current == rec:
+                            continue
+                        if all(current[k] == rec[k] for k in rec if k not in MUTABLE[kind]):
+                            changed = [k for k in MUTABLE[kind] if current[k] != rec[k]]
+                            undo.append(('update', obj, {k: current[k] for k in changed}))
+                            obj.update(**{k: rec[k] for k in changed})
+                            counters['updated'] += 1
+                            continue
+                        obj.delete()
+                    kwargs = to_kwargs(kind, rec)
+                    if kwargs is None:
+                        counters['skipped'] += 1
+                        continue
+                    cls.create(**kwargs)
+                    counters['created'] += 1
+        except BaseException:
+            events.unsubscribe(record)
+            _rollback(undo)
+            raise
+        events.unsubscribe(record)
+    return counters
+
+
+def _rollback(undo: list):
+    """
+    Отменяет шаги apply. Созданные объекты удаляются, удаленные возвращаются в хранилища
+    (те же объекты), обновленные получают прежние значения — в обратном порядке, поэтому
+    зависимые объекты отменяются раньше основных. Очистки выполняются первыми, поэтому
+    очищенные хранилища восстанавливаются последними и в прямом порядке: пользователи
+    и жилье раньше ссылающихся на них бронирований и отзывов. Отмена порождает обычные
+    события, и журнал или отслеживание изменений получают ее как новые операции.
+    """
+    clears = [step for step in undo if step[0] == 'clear']
+    for op, obj, data in reversed(undo):
+        if op == 'create':
+            obj.delete()
+        elif op == 'delete':
+            type(obj)._register(obj)
+            events.emit('create', obj)
+        elif op == 'update':
+            obj.update(**data)
+    for _, cls, objs in clears:
+        for obj in objs:
+            cls._register(obj)
+            events.emit('create', obj)
+    if clears:
+        recount_ratings()  # Очистка не меняла гистограммы оценок, а возврат отзывов учел их снова
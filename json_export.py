@@ -0,0 +1,134 @@
+# Быстрая выгрузка хранилищ в JSON: компактный формат Manager.save_to_json или NDJSON,
+# запись блоками без промежуточных словарей для каждого объекта
+import json
+import math
+from json.encoder import encode_basestring  # Кодирование строки как при ensure_ascii=False
+from records import ENTITIES, to_record
+
+try:
+    import orjson
+except ImportError:  # orjson не обязателен: он ускоряет разбор NDJSON и может кодировать выгрузку
+    orjson = None
+
+FORMATS = ('compact', 'ndjson')
+
+
+def _number(value) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, float) and not math.isfinite(value):
+        return json.dumps(value)
+    return repr(value)
+
+
+def _string(value) -> str:
+    # Комментарий отзыва не проверяется конструктором: после загрузки из XML пустой
+    # комментарий равен None
+    if value is None:
+        return 'null'
+    if isinstance(value, str):
+        return encode_basestring(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _user(u) -> str:
+    return (f'{{"user_id":{u.user_id},"name":{encode_basestring(u.name)},'
+            f'"contact_info":{encode_basestring(u.contact_info)}}}')
+
+
+def _housing(h) -> str:
+    loc = h.location
+    return (f'{{"housing_id":{h.housing_id},"location":{{"city":{encode_basestring(loc.city)},'
+            f'"street":{encode_basestring(loc.street)},"building_number":{encode_basestring(loc.building_number)},'
+            f'"postal_code":{_number(loc.postal_code)}}},"price_per_night":{_number(h.price_per_night)},'
+            f'"description":{encode_basestring(h.description)}}}')
+
+
+def _booking(b) -> str:
+    return (f'{{"booking_id":{b.booking_id},"user_id":{b.user_id},"housing_id":{b.housing_id},'
+            f'"start_date":"{b.start_date}","end_date":"{b.end_date}"}}')
+
+
+def _review(r) -> str:
+    return (f'{{"review_id":{r.review_id},"user_id":{r.user_id},"housing_id":{r.housing_id},'
+            f'"rating":{r.rating},"comment":{_string(r.comment)}}}')
+
+
+# Форматирование записи объекта напрямую в строку JSON (поля и порядок — как в records.to_record)
+ENCODERS = {'users': _user, 'housings': _housing, 'bookings': _booking, 'reviews': _review}
+
+
+def _chunks(objects, size: int):
+    chunk = []
+    for obj in objects:
+        chunk.append(obj)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_json(fmt: str = 'compact', chunk_size: int = 10000, use_orjson: bool = False, counts: dict = None):
+    """
+    Отдает выгрузку всех хранилищ блоками по chunk_size объектов (вызывать под блокировкой
+    хранилищ после materialize_all). Форматы:
+      compact — структура файла Manager.save_to_json без отступов;
+      ndjson  — по строке на объект вида {"<раздел>": запись}, разделы в порядке сохранения.
+    По умолчанию записи форматируются напрямую из атрибутов объектов (ENCODERS) и блоки — str.
+    При use_orjson записи собираются в словари и кодируются orjson, блоки — bytes; на наборах
+    из benchmarks это не быстрее встроенного пути, так как основное время уходит на обход объектов.
+    Если передан словарь counts, в него записывается число выгруженных записей каждого раздела.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}. Допустимы: {', '.join(FORMATS)}.")
+    if use_orjson and orjson is None:
+        raise ImportError("Для use_orjson=True нужен пакет orjson.")
+    ndjson = fmt == 'ndjson'
+    lit = (lambda s: s.encode()) if use_orjson else (lambda s: s)
+
+    if not ndjson:
+        yield lit('{')
+    for n, (kind, cls) in enumerate(ENTITIES.items()):
+        if not ndjson:
+            yield lit(f'{"," if n else ""}"{kind}":[')
+        first = True
+        objs = cls.get_all()
+        if counts is not None:
+            counts[kind] = len(objs)
+        for chunk in _chunks(objs, chunk_size):
+            if use_orjson:
+                if ndjson:
+                    # {"kind":{...}}\n для каждой записи: заголовок и хвост строки добавляются к готовым записям
+                    head = f'{{"{kind}":'.encode()
+                    yield b''.join(head + orjson.dumps(to_record(obj)) + b'}\n' for obj in chunk)
+                else:
+                    # Блок кодируется одним массивом, от которого отрезаются скобки
+                    body = orjson.dumps([to_record(obj) for obj in chunk])[1:-1]
+                    yield body if first else b',' + body
+            else:
+                encode = ENCODERS[kind]
+                if ndjson:
+                    head = f'{{"{kind}":'
+                    yield ''.join([f'{head}{encode(obj)}}}\n' for obj in chunk])
+                else:
+                    body = ','.join([encode(obj) for obj in chunk])
+                    yield body if first else ',' + body
+            first = False
+        if not ndjson:
+            yield lit(']')
+    if not ndjson:
+        yield lit('}\n')
+
+
+def iter_ndjson(f):
+    """Отдает пары (раздел, запись) из файла NDJSON, записанного iter_json(fmt='ndjson')."""
+    loads = orjson.loads if orjson is not None else json.loads
+    for line in f:
+        if not line.strip():
+            continue
+        obj = loads(line)
+        if not isinstance(obj, dict) or len(obj) != 1:
+            raise json.JSONDecodeError("Ожидается объект вида {\"<раздел>\": запись}", "", 0)
+        (section, rec), = obj.items()
+        yield section, rec
@@ -0,0 +1,105 @@
+# Потоковый разбор JSON: документ читается кусками, записи массивов отдаются по одной
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+# Значение, обрезанное границей куска, дает ошибку не дальше длины самого длинного
+# неделимого токена ('-Infinity') от конца буфера либо незакрытую строку
+_TRUNCATED_TAIL = len('-Infinity')
+
+class JsonStreamReader:
+    """
+    Инкрементальный читатель JSON-документа вида {"раздел": [запись, запись, ...], ...}.
+    В памяти одновременно находится только текущий кусок файла и одна разобранная запись.
+    """
+
+    def __init__(self, f, chunk_size: int = 1 << 16):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Дочитывает следующий кусок файла, отбрасывая уже разобранную часть буфера."""
+        if self._eof:
+            return False
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _error(self, message: str):
+        return json.JSONDecodeError(message, self._buf, self._pos)
+
+    def _peek(self) -> str:
+        """Возвращает следующий значащий символ (пропуская пробелы) или '' в конце файла."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise self._error(f"Ожидался символ '{char}'")
+        self._pos += 1
+
+    def _value(self):
+        """Разбирает одно JSON-значение, при необходимости дочитывая файл."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                # Дочитываем файл, только если значение могло оборваться на конце буфера:
+                # ошибка в середине записи не должна загружать в память остаток файла
+                truncated = e.pos >= len(self._buf) - _TRUNCATED_TAIL or e.msg.startswith("Unterminated string")
+                if truncated and self._fill():
+                    continue
+                raise
+            # Число на границе куска могло быть прочитано не полностью: из "-1.5e" без
+            # продолжения разбирается -1.5, и разбор останавливается раньше конца буфера
+            near_end = end == len(self._buf) or (isinstance(value, (int, float))
+                                                 and end >= len(self._buf) - _TRUNCATED_TAIL)
+            if near_end and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def records(self):
+        """Генератор пар (раздел, запись) по всем массивам верхнего уровня."""
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise self._error("Ожидалось имя раздела")
+            self._expect(":")
+            if self._peek() == "[":
+                self._pos += 1
+                if self._peek() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield key, self._value()
+                        char = self._peek()
+                        self._pos += 1
+                        if char == "]":
+                            break
+                        if char != ",":
+                            raise self._error("Ожидался символ ',' или ']'")
+            else:
+                self._value()  # Не-массивы верхнего уровня пропускаются
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise self._error("Ожидался символ ',' или '}'")
@@ -1,116 +1,614 @@
 
 import json
+import os
+import sqlite3
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from classes import Address, User, Housing, Booking, Review
+from classes import User, Housing, Booking, Review
+from classes.locking import store_lock
+from json_stream import JsonStreamReader
+import json_export
+from xml_stream import XmlStreamWriter, iter_records
+from records import ENTITIES, to_record, to_kwargs, materialize_all
+import metrics
+import atomic
+import snapshot
+import shards
+import storage
+import columns
+import delta
+from wal import Journal
+
+class SaveCancelled(Exception):
+    """Сохранение прервано через cancel; файл назначения не изменен."""
+    pass
+
+class _AtomicOutput:
+    """
+    Файл для сохранения: текст копится блоками по chunk_size символов и пишется во временный
+    файл, который подменяет filename только после успешной записи всех данных. Если задан
+    cancel (threading.Event) и он установлен, запись прерывается на границе блока исключением
+    SaveCancelled, а временный файл удаляется. При binary=True пишутся bytes.
+    """
+    def __init__(self, filename: str, cancel=None, chunk_size: int = 1 << 16, binary: bool = False):
+        self._filename = filename
+        self._binary = binary
+        self._cancel = cancel
+        self._chunk_size = chunk_size
+        self._chunks = []
+        self._size = 0
+
+    def __enter__(self):
+        # Свой временный файл у каждого сохранения: одновременные сохранения в один файл
+        # (например, периодические из AsyncManager) не пишут в общий временный файл
+        fd, self._tmp = atomic.temp_file(self._filename)
+        self._f = os.fdopen(fd, 'wb') if self._binary else os.fdopen(fd, 'w', encoding='utf-8')
+        return self
+
+    def write(self, text: str):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self._chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if self._cancel is not None and self._cancel.is_set():
+            raise SaveCancelled(f"Сохранение в {self._filename} отменено.")
+        self._f.write((b'' if self._binary else '').join(self._chunks))
+        self._chunks = []
+        self._size = 0
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._flush()
+        except BaseException:
+            exc_type = True
+            raise
+        finally:
+            self._f.close()
+            if exc_type is None:
+                atomic.replace(self._tmp, self._filename)
+            else:
+                os.remove(self._tmp)
+
+class _BatchLoader:
+    """
+    Копит строки одного раздела и передает их в create_many пачками по batch_size.
+    Строки бронирований и отзывов с user_id/housing_id, для которых нет объекта, пропускаются.
+    При включенных метриках связывание ссылок и создание объектов замеряются как фазы
+    <name>.resolve и <name>.construct.
+    """
+    def __init__(self, batch_size: int = 10000, progress=None, name: str = "manager.load"):
+        self.counters = {"users": 0, "housings": 0, "bookings": 0, "reviews": 0, "skipped": 0}
+        self._batch_size = batch_size
+        self._progress = progress
+        self._name = name
+        self._section = None
+        self._rows = []
+
+    def add(self, section: str, row: dict):
+        if section != self._section:
+            self.flush()
+            self._section = section
+        self._rows.append(row)
+        if len(self._rows) >= self._batch_size:
+            self.flush()
+
+    def extend(self, section: str, rows: list):
+        """Добавляет готовый список строк раздела; пачка может превысить batch_size на его длину."""
+        if section != self._section:
+            self.flush()
+            self._section = section
+        self._rows.extend(rows)
+        if len(self._rows) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        with metrics.phase(self._name + ".resolve") as phase:
+            rows = [row for row in self._rows if to_kwargs(self._section, row) is not None]
+            phase.rows = len(self._rows)
+        self.counters["skipped"] += len(self._rows) - len(rows)
+        self._rows = []
+        if rows:
+            with metrics.phase(self._name + ".construct") as phase:
+                ENTITIES[self._section].create_many(rows)
+                phase.rows = len(rows)
+            self.counters[self._section] += len(rows)
+        if self._progress:
+            self._progress(dict(self.counters))
+
+    def total(self) -> int:
+        return sum(self.counters.values())
+
+_XML_TAGS = {'users': 'user', 'housings': 'housing', 'bookings': 'booking', 'reviews': 'review'}
+_XML_KINDS = {tag: kind for kind, tag in _XML_TAGS.items()}
+
+def _write_xml_record(w: XmlStreamWriter, kind: str, obj):
+    """Пишет один объект в виде XML-элемента (общий формат полной выгрузки и дельты)."""
+    if kind == 'users':
+        w.start("user", id=obj.user_id)
+        w.element("name", obj.name)
+        w.element("contact_info", obj.contact_info)
+    elif kind == 'housings':
+        w.start("housing", id=obj.housing_id, price=obj.price_per_night)
+        w.start("location")
+        w.element("city", obj.location.city)
+        w.element("street", obj.location.street)
+        w.element("building_number", obj.location.building_number)
+        if obj.location.postal_code: w.element("postal_code", obj.location.postal_code)
+        w.end()
+        w.element("description", obj.description)
+    elif kind == 'bookings':
+        w.start("booking", id=obj.booking_id, user_id=obj.user_id, housing_id=obj.housing_id)
+        w.element("start_date", obj.start_date)
+        w.element("end_date", obj.end_date)
+    else:
+        w.start("review", id=obj.review_id, user_id=obj.user_id, housing_id=obj.housing_id, rating=obj.rating)
+        w.element("comment", obj.comment)
+    w.end()
+
+def _xml_row(tag: str, node) -> dict:
+    """Разбирает XML-элемент объекта в запись формата JSON."""
+    if tag == 'user':
+        return dict(user_id=int(node.get('id')), name=node.find('name').text, contact_info=node.find('contact_info').text)
+    if tag == 'housing':
+        loc_node = node.find('location')
+        pc_node = loc_node.find('postal_code')
+        location = dict(city=loc_node.find('city').text, street=loc_node.find('street').text, building_number=loc_node.find('building_number').text, postal_code=int(pc_node.text) if pc_node is not None else None)
+        return dict(housing_id=int(node.get('id')), price_per_night=float(node.get('price')), description=node.find('description').text, location=location)
+    if tag == 'booking':
+        return dict(booking_id=int(node.get('id')), user_id=int(node.get('user_id')), housing_id=int(node.get('housing_id')), start_date=node.find('start_date').text, end_date=node.find('end_date').text)
+    return dict(review_id=int(node.get('id')), user_id=int(node.get('user_id')), housing_id=int(node.get('housing_id')), rating=int(node.get('rating')), comment=node.find('comment').text)
 
 class Manager:
     """
     Статический класс-сервис, который отвечает только за сохранение (сериализацию)
     и загрузку (десериализацию) данных из файлов.
     """
+    _journal = None  # Открытый журнал изменений (см. open_journal)
+    _tracker = None  # Отслеживание изменений для выгрузки дельт (см. track_changes)
 
     @staticmethod
-    def save_to_json(filename: str):
-        """Сохраняет текущее состояние всех объектов из классов в файл JSON."""
-        # ... (код этого метода остается без изменений) ...
-        data = {
-            "users": [u.__dict__ for u in User.get_all()],
-            "housings": [{'housing_id': h.housing_id, 'location': h.location.__dict__, 'price_per_night': h.price_per_night, 'description': h.description} for h in Housing.get_all()],
-            "bookings": [{"booking_id": b.booking_id, "user_id": b.user.user_id, "housing_id": b.housing.housing_id, "start_date": b.start_date, "end_date": b.end_date} for b in Booking.get_all()],
-            "reviews": [{"review_id": r.review_id, "user_id": r.user.user_id, "housing_id": r.housing.housing_id, "rating": r.rating, "comment": r.comment} for r in Review.get_all()]
-        }
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        print(f"✅ Данные успешно сохранены в {filename}")
-
-    @staticmethod
-    def load_from_json(filename: str):
-        """Загружает данные из файла JSON, полностью перезаписывая текущее состояние."""
-        # ... (код этого метода остается без изменений) ...
-        User.clear_all(); Housing.clear_all(); Booking.clear_all(); Review.clear_all()
+    def _take_changes():
+        """Забирает накопленные изменения (вызывать под блокировкой хранилищ)."""
+        return Manager._tracker.take() if Manager._tracker is not None else None
+
+    @staticmethod
+    def _restore_changes(taken):
+        if taken is not None and Manager._tracker is not None:
+            Manager._tracker.restore(taken)
+
+    @staticmethod
+    def save_to_json(filename: str, cancel=None):
+        """
+        Сохраняет текущее состояние всех объектов из классов в файл JSON.
+        Файл пишется блоками во временный и подменяет старый только целиком; установленный
+        cancel (threading.Event) прерывает сохранение исключением SaveCancelled.
+        """
+        with metrics.phase("manager.save_to_json") as total:
+            with store_lock.read_after(materialize_all):
+                with metrics.phase("manager.save_to_json.serialize") as phase:
+                    data = {kind: [to_record(obj) for obj in cls.get_all()] for kind, cls in ENTITIES.items()}
+                    phase.rows = total.rows = sum(map(len, data.values()))
+                taken = Manager._take_changes()  # Полная выгрузка — новая база для дельт
+            try:
+                with metrics.phase("manager.save_to_json.write") as phase, _AtomicOutput(filename, cancel) as f:
+                    json.dump(data, f, ensure_ascii=False, indent=4)
+                    phase.rows = total.rows
+            except BaseException:
+                Manager._restore_changes(taken)
+                raise
+        metrics.log("saved", f"Данные успешно сохранены в {filename}", path=filename)
+
+    @staticmethod
+    def load_from_json(filename: str, stream: bool = False, progress=None):
+        """
+        Загружает данные из файла JSON, полностью перезаписывая текущее состояние.
+        При stream=True файл разбирается потоково (см. _load_json_stream).
+        """
+        with store_lock.write():
+            User.clear_all(); Housing.clear_all(); Booking.clear_all(); Review.clear_all()
+            if stream:
+                return Manager._load_json_stream(filename, progress)
+            try:
+                with metrics.phase("manager.load_from_json") as total:
+                    with metrics.phase("manager.load_from_json.parse"):
+                        with open(filename, 'r', encoding='utf-8') as f: data = json.load(f)
+                    loader = _BatchLoader(batch_size=float('inf'), name="manager.load_from_json")
+                    for section in ('users', 'housings', 'bookings', 'reviews'):
+                        for row in data.get(section, []):
+                            loader.add(section, row)
+                    loader.flush()
+                    total.rows = loader.total()
+                metrics.log("loaded", f"Данные успешно загружены из {filename}", path=filename)
+            except FileNotFoundError:
+                metrics.log("not_found", f"Файл {filename} не найден. Загрузка не выполнена.", ok=False, path=filename)
+            except json.JSONDecodeError:
+                metrics.log("corrupted", f"Ошибка чтения файла {filename}. Возможно, он поврежден.", ok=False, path=filename)
+
+    @staticmethod
+    def _load_json_stream(filename: str, progress=None, batch_size: int = 10000):
+        """
+        Потоковая загрузка JSON: записи разделов users, housings, bookings и reviews
+        разбираются по одной и пачками по batch_size передаются в create_many, поэтому
+        пиковая память близка к размеру итогового графа объектов. Разделы должны идти
+        в порядке сохранения (пользователи и жилье раньше бронирований и отзывов).
+        Возвращает счетчики загруженных записей; progress(counters) вызывается после каждой пачки.
+        """
+        loader = _BatchLoader(batch_size, progress, name="manager.load_from_json")
         try:
-            with open(filename, 'r', encoding='utf-8') as f: data = json.load(f)
-            for u_data in data.get('users', []): User.create(**u_data)
-            for h_data in data.get('housings', []):
-                addr = Address(**h_data.pop('location'))
-                Housing.create(location=addr, **h_data)
-            user_map = {u.user_id: u for u in User.get_all()}
-            housing_map = {h.housing_id: h for h in Housing.get_all()}
-            for b_data in data.get('bookings', []):
-                user = user_map.get(b_data.pop('user_id'))
-                housing = housing_map.get(b_data.pop('housing_id'))
-                if user and housing: Booking.create(user=user, housing=housing, **b_data)
-            for r_data in data.get('reviews', []):
-                user = user_map.get(r_data.pop('user_id'))
-                housing = housing_map.get(r_data.pop('housing_id'))
-                if user and housing: Review.create(user=user, housing=housing, **r_data)
-            print(f"✅ Данные успешно загружены из {filename}")
+            with metrics.phase("manager.load_from_json") as total, open(filename, 'r', encoding='utf-8') as f:
+                for section, rec in metrics.timed_iter(JsonStreamReader(f).records(), "manager.load_from_json.parse"):
+                    if section in ENTITIES:
+                        loader.add(section, rec)
+                loader.flush()
+                total.rows = loader.total()
+            metrics.log("loaded", f"Данные успешно загружены из {filename}", path=filename)
         except FileNotFoundError:
-            print(f"⚠️ Файл {filename} не найден. Загрузка не выполнена.")
+            metrics.log("not_found", f"Файл {filename} не найден. Загрузка не выполнена.", ok=False, path=filename)
         except json.JSONDecodeError:
-            print(f"⚠️ Ошибка чтения файла {filename}. Возможно, он поврежден.")
-
-    @staticmethod
-    def save_to_xml(filename: str):
-        """Сохраняет текущее состояние всех объектов из классов в файл XML."""
-        # ... (код этого метода остается без изменений) ...
-        root = ET.Element("data")
-        users_el = ET.SubElement(root, "users")
-        for u in User.get_all():
-            user_el = ET.SubElement(users_el, "user", id=str(u.user_id))
-            ET.SubElement(user_el, "name").text = u.name
-            ET.SubElement(user_el, "contact_info").text = u.contact_info
-        housings_el = ET.SubElement(root, "housings")
-        for h in Housing.get_all():
-            h_el = ET.SubElement(housings_el, "housing", id=str(h.housing_id), price=str(h.price_per_night))
-            loc_el = ET.SubElement(h_el, "location")
-            ET.SubElement(loc_el, "city").text = h.location.city
-            ET.SubElement(loc_el, "street").text = h.location.street
-            ET.SubElement(loc_el, "building_number").text = str(h.location.building_number)
-            if h.location.postal_code: ET.SubElement(loc_el, "postal_code").text = str(h.location.postal_code)
-            ET.SubElement(h_el, "description").text = h.description
-        bookings_el = ET.SubElement(root, "bookings")
-        for b in Booking.get_all():
-            b_el = ET.SubElement(bookings_el, "booking", id=str(b.booking_id), user_id=str(b.user.user_id), housing_id=str(b.housing.housing_id))
-            ET.SubElement(b_el, "start_date").text = b.start_date
-            ET.SubElement(b_el, "end_date").text = b.end_date
-        reviews_el = ET.SubElement(root, "reviews")
-        for r in Review.get_all():
-            r_el = ET.SubElement(reviews_el, "review", id=str(r.review_id), user_id=str(r.user.user_id), housing_id=str(r.housing.housing_id), rating=str(r.rating))
-            ET.SubElement(r_el, "comment").text = r.comment
-        xml_string = ET.tostring(root, 'utf-8')
-        pretty_xml = minidom.parseString(xml_string).toprettyxml(indent="    ")
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(pretty_xml)
-        print(f"✅ Данные успешно сохранены в {filename}")
+            metrics.log("corrupted", f"Ошибка чтения файла {filename}. Возможно, он поврежден.", ok=False, path=filename)
+        return loader.counters
+
+    @staticmethod
+    def export_json(filename: str, fmt: str = 'compact', chunk_size: int = 10000, use_orjson: bool = False, cancel=None):
+        """
+        Быстрая выгрузка в JSON (см. json_export.iter_json): записи форматируются из объектов
+        хранилищ блоками по chunk_size без промежуточных словарей и отступов.
+        fmt='compact' — файл для load_from_json, fmt='ndjson' — для load_from_ndjson.
+        Как и save_to_json, файл подменяется целиком, а cancel прерывает выгрузку.
+        """
+        with store_lock.read_after(materialize_all):
+            taken = Manager._take_changes()  # Полная выгрузка — новая база для дельт
+            try:
+                with metrics.phase(f"manager.export_json.{fmt}") as total, \
+                        _AtomicOutput(filename, cancel, binary=use_orjson) as f:
+                    counts = {}
+                    for chunk in json_export.iter_json(fmt, chunk_size, use_orjson, counts):
+                        f.write(chunk)
+                    total.rows = sum(counts.values())
+            except BaseException:
+                Manager._restore_changes(taken)
+                raise
+        metrics.log("saved", f"Данные успешно сохранены в {filename}", path=filename)
+
+    @staticmethod
+    def load_from_ndjson(filename: str, progress=None, batch_size: int = 10000):
+        """
+        Загружает данные из файла NDJSON (см. export_json), полностью перезаписывая текущее
+        состояние. Строки разбираются по одной и пачками передаются в create_many, как
+        при потоковой загрузке JSON. Возвращает счетчики загруженных записей.
+        """
+        with store_lock.write():
+            User.clear_all(); Housing.clear_all(); Booking.clear_all(); Review.clear_all()
+            loader = _BatchLoader(batch_size, progress, name="manager.load_from_ndjson")
+            try:
+                with metrics.phase("manager.load_from_ndjson") as total, open(filename, 'rb') as f:
+                    for section, rec in metrics.timed_iter(json_export.iter_ndjson(f), "manager.load_from_ndjson.parse"):
+                        if section in ENTITIES:
+                            loader.add(section, rec)
+                    loader.flush()
+                    total.rows = loader.total()
+                metrics.log("loaded", f"Данные успешно загружены из {filename}", path=filename)
+            except FileNotFoundError:
+                metrics.log("not_found", f"Файл {filename} не найден. Загрузка не выполнена.", ok=False, path=filename)
+            except json.JSONDecodeError:
+                metrics.log("corrupted", f"Ошибка чтения файла {filename}. Возможно, он поврежден.", ok=False, path=filename)
+            return loader.counters
+
+    @staticmethod
+    def save_to_xml(filename: str, indent: str = "    ", cancel=None):
+        """
+        Сохраняет текущее состояние всех объектов из классов в файл XML.
+        Записи пишутся в файл потоково; indent=None отключает отступы и переводы строк.
+        Как и в save_to_json, файл подменяется целиком, а cancel прерывает сохранение.
+        """
+        with store_lock.read_after(materialize_all):
+            taken = Manager._take_changes()  # Полная выгрузка — новая база для дельт
+            try:
+                # Записи формируются и пишутся потоково, поэтому сериализация — одна фаза
+                with metrics.phase("manager.save_to_xml") as total, _AtomicOutput(filename, cancel) as f:
+                    w = XmlStreamWriter(f, indent)
+                    w.declaration()
+                    w.start("data")
+                    for kind, cls in ENTITIES.items():
+                        w.start(kind)
+                        objs = cls.get_all()
+                        for obj in objs:
+                            _write_xml_record(w, kind, obj)
+                        w.end()
+                        total.rows += len(objs)
+                    w.end()
+            except BaseException:
+                Manager._restore_changes(taken)
+                raise
+            metrics.log("saved", f"Данные успешно сохранены в {filename}", path=filename)
 
     @staticmethod
     def load_from_xml(filename: str):
-        """Загружает данные из файла XML, полностью перезаписывая текущее состояние."""
-        # ... (код этого метода остается без изменений) ...
-        User.clear_all(); Housing.clear_all(); Booking.clear_all(); Review.clear_all()
+        """
+        Загружает данные из файла XML, полностью перезаписывая текущее состояние.
+        Файл разбирается через iterparse: обработанные записи сразу освобождаются.
+        """
+        with store_lock.write():
+            User.clear_all(); Housing.clear_all(); Booking.clear_all(); Review.clear_all()
+            try:
+                loader = _BatchLoader(name="manager.load_from_xml")
+                with metrics.phase("manager.load_from_xml") as total:
+                    rows = ((_XML_KINDS[tag], _xml_row(tag, node)) for tag, node in iter_records(filename, set(_XML_KINDS)))
+                    for section, row in metrics.timed_iter(rows, "manager.load_from_xml.parse"):
+                        loader.add(section, row)
+                    loader.flush()
+                    total.rows = loader.total()
+                metrics.log("loaded", f"Данные успешно загружены из {filename}", path=filename)
+            except FileNotFoundError:
+                metrics.log("not_found", f"Файл {filename} не найден. Загрузка не выполнена.", ok=False, path=filename)
+            except ET.ParseError:
+                metrics.log("corrupted", f"Ошибка чтения файла {filename}. Возможно, он поврежден.", ok=False, path=filename)
+
+    @staticmethod
+    def track_changes():
+        """
+        Включает отслеживание изменений: после этого save_delta_json/save_delta_xml выгружают
+        только объекты, созданные, измененные или удаленные с момента предыдущей выгрузки
+        (полной или дельты).
+        """
+        if Manager._tracker is None:
+            Manager._tracker = delta.ChangeTracker()
+
+    @staticmethod
+    def stop_tracking():
+        """Отключает отслеживание изменений."""
+        if Manager._tracker is not None:
+            Manager._tracker.close()
+            Manager._tracker = None
+
+    @staticmethod
+    def _take_delta():
+        with store_lock.read():
+            taken = Manager._tracker.take()
+            return taken, delta.collect(taken)
+
+    @staticmethod
+    def save_delta_json(filename: str):
+        """
+        Сохраняет в файл JSON только изменения с момента предыдущей выгрузки:
+        очищенные хранилища ('clear'), новые и измененные записи (разделы users, housings,
+        bookings, reviews) и ID удаленных объектов ('deleted').
+        """
+        if Manager._tracker is None:
+            metrics.log("tracking_disabled", "Отслеживание изменений не включено. Дельта не сохранена.", ok=False)
+            return
+        taken, changes = Manager._take_delta()
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(changes, f, ensure_ascii=False, indent=4)
+        except BaseException:
+            Manager._restore_changes(taken)
+            raise
+        metrics.log("delta_saved", f"Изменения успешно сохранены в {filename}", path=filename)
+
+    @staticmethod
+    def save_delta_xml(filename: str, indent: str = "    "):
+        """Сохраняет изменения с момента предыдущей выгрузки в файл XML (см. save_delta_json)."""
+        if Manager._tracker is None:
+            metrics.log("tracking_disabled", "Отслеживание изменений не включено. Дельта не сохранена.", ok=False)
+            return
+        with store_lock.read():
+            taken = Manager._tracker.take()
+            try:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    w = XmlStreamWriter(f, indent)
+                    w.declaration()
+                    w.start("delta")
+                    cleared, changed = taken
+                    for kind in ENTITIES:
+                        if kind in cleared:
+                            w.element("clear", None, kind=kind)
+                    for kind, items in changed.items():
+                        w.start(kind)
+                        for obj in items.values():
+                            if obj is not None:
+                                _write_xml_record(w, kind, obj)
+                        w.end()
+                    w.start("deleted")
+                    for kind, items in changed.items():
+                        for item_id, obj in items.items():
+                            if obj is None:
+                                w.element("item", None, kind=kind, id=item_id)
+                    w.end()
+                    w.end()
+            except BaseException:
+                Manager._restore_changes(taken)
+                raise
+        metrics.log("delta_saved", f"Изменения успешно сохранены в {filename}", path=filename)
+
+    @staticmethod
+    def apply_delta(filename: str):
+        """
+        Применяет к текущему состоянию дельту из файла JSON или XML (по расширению .xml),
+        сохраненную через save_delta_json/save_delta_xml. Возвращает счетчики изменений.
+        """
         try:
-            tree = ET.parse(filename)
-            root = tree.getroot()
-            for u_node in root.find('users'): User.create(user_id=int(u_node.get('id')), name=u_node.find('name').text, contact_info=u_node.find('contact_info').text)
-            for h_node in root.find('housings'):
-                loc_node = h_node.find('location')
-                pc_node = loc_node.find('postal_code')
-                address = Address(city=loc_node.find('city').text, street=loc_node.find('street').text, building_number=loc_node.find('building_number').text, postal_code=int(pc_node.text) if pc_node is not None else None)
-                Housing.create(housing_id=int(h_node.get('id')), price_per_night=float(h_node.get('price')), description=h_node.find('description').text, location=address)
-            user_map = {u.user_id: u for u in User.get_all()}
-            housing_map = {h.housing_id: h for h in Housing.get_all()}
-            for b_node in root.find('bookings'):
-                user = user_map.get(int(b_node.get('user_id')))
-                housing = housing_map.get(int(b_node.get('housing_id')))
-                if user and housing: Booking.create(booking_id=int(b_node.get('id')), user=user, housing=housing, start_date=b_node.find('start_date').text, end_date=b_node.find('end_date').text)
-            for r_node in root.find('reviews'):
-                user = user_map.get(int(r_node.get('user_id')))
-                housing = housing_map.get(int(r_node.get('housing_id')))
-                if user and housing: Review.create(review_id=int(r_node.get('id')), user=user, housing=housing, rating=int(r_node.get('rating')), comment=r_node.find('comment').text)
-            print(f"✅ Данные успешно загружены из {filename}")
+            if filename.endswith('.xml'):
+                changes = {'clear': [], 'deleted': {kind: [] for kind in ENTITIES}}
+                changes.update({kind: [] for kind in ENTITIES})
+                for tag, node in iter_records(filename, set(_XML_KINDS) | {'clear', 'item'}):
+                    if tag == 'clear':
+                        changes['clear'].append(node.get('kind'))
+                    elif tag == 'item':
+                        changes['deleted'][node.get('kind')].append(int(node.get('id')))
+                    else:
+                        changes[_XML_KINDS[tag]].append(_xml_row(tag, node))
+            else:
+                with open(filename, 'r', encoding='utf-8') as f: changes = json.load(f)
         except FileNotFoundError:
-            print(f"⚠️ Файл {filename} не найден. Загрузка не выполнена.")
-        except ET.ParseError:
-            print(f"⚠️ Ошибка чтения файла {filename}. Возможно, он поврежден.")
\ No newline at end of file
+            metrics.log("not_found", f"Файл {filename} не найден. Изменения не применены.", ok=False, path=filename)
+            return None
+        except (json.JSONDecodeError, ET.ParseError):
+            metrics.log("corrupted", f"Ошибка чтения файла {filename}. Возможно, он поврежден.", ok=False, path=filename)
+            return None
+        counters = delta.apply(changes)
+        metrics.log("delta_applied", f"Изменения из {filename} применены", path=filename)
+        return counters
+
+    @staticmethod
+    def load_with_deltas(base_filename: str, delta_filenames):
+        """
+        Загружает базовую полную выгрузку (JSON или XML по расширению) и по порядку
+        применяет к ней дельты.
+        """
+        with store_lock.write():
+            if base_filename.endswith('.xml'):
+                Manager.load_from_xml(base_filename)
+            else:
+                Manager.load_from_json(base_filename)
+            for filename in delta_filenames:
+                Manager.apply_delta(filename)
+
+    @staticmethod
+    def save_snapshot(filename: str):
+        """Сохраняет текущее состояние всех объектов в бинарный снимок (см. snapshot.py)."""
+        with metrics.phase("manager.save_snapshot"):
+            snapshot.save_snapshot(filename)
+        metrics.log("snapshot_saved", f"Снимок успешно сохранен в {filename}", path=filename)
+
+    @staticmethod
+    def load_snapshot(filename: str):
+        """
+        Подключает бинарный снимок через mmap, полностью заменяя текущее состояние.
+        Объекты создаются лениво при обращении к ним, поэтому загрузка не зависит от объема данных.
+        Если открыт журнал или включено отслеживание изменений, объекты сразу догружаются:
+        журнал сворачивается в контрольную точку, а объекты отмечаются как измененные.
+        """
+        try:
+            with metrics.phase("manager.load_snapshot"), store_lock.write():
+                snapshot.load_snapshot(filename)
+                if Manager._tracker is not None or Manager._journal is not None:
+                    Manager._after_snapshot()
+            metrics.log("snapshot_loaded", f"Снимок подключен из {filename}", path=filename)
+        except FileNotFoundError:
+            metrics.log("not_found", f"Файл {filename} не найден. Загрузка не выполнена.", ok=False, path=filename)
+        except snapshot.SnapshotError:
+            metrics.log("corrupted", f"Ошибка чтения файла {filename}. Возможно, он поврежден.", ok=False, path=filename)
+
+    @staticmethod
+    def _after_snapshot():
+        """
+        Подключение снимка не порождает событий create, поэтому дельты и журнал
+        получают новое состояние явно: все объекты догружаются и отмечаются в отслеживании
+        изменений, а журнал сворачивается в контрольную точку.
+        """
+        with store_lock.read_after(materialize_all):
+            if Manager._tracker is not None:
+                Manager._tracker.mark_all()
+        if Manager._journal is not None:
+            Manager._journal.checkpoint()
+
+    @staticmethod
+    def save_sharded(directory: str, shards_count: int = None, workers: int = None):
+        """
+        Сохраняет состояние в каталог directory частями по shards_count файлов на каждый класс
+        (по умолчанию — по числу ядер); части пишутся параллельно в пуле процессов (см. shards.py).
+        """
+        with metrics.phase("manager.save_sharded"):
+            shards.save_sharded(directory, shards_count, workers)
+        metrics.log("saved", f"Данные успешно сохранены в {directory}", path=directory)
+
+    @staticmethod
+    def load_sharded(directory: str, workers: int = None, progress=None):
+        """
+        Загружает данные из каталога частей, полностью перезаписывая текущее состояние.
+        Части разбираются и проверяются параллельно в пуле процессов, затем сливаются
+        в хранилища, а ссылки бронирований и отзывов связываются с созданными объектами.
+        Если какая-либо часть повреждена (в том числе содержит некорректные записи, повторяет
+        ID другой части или бронирование пересекается с бронированием из другой части),
+        текущее состояние не меняется: все проверки выполняются до очистки хранилищ.
+        Возвращает счетчики загруженных записей.
+        """
+        try:
+            with metrics.phase("manager.load_sharded.parse") as phase:
+                parts = shards.read_sharded(directory, workers)
+                phase.rows = sum(len(rows) for _, rows in parts)
+        except FileNotFoundError as e:
+            metrics.log("not_found", f"Файл {e.filename} не найден. Загрузка не выполнена.", ok=False, path=e.filename)
+            return None
+        except (json.JSONDecodeError, shards.ShardError):
+            metrics.log("corrupted", f"Ошибка чтения каталога {directory}. Возможно, он поврежден.", ok=False, path=directory)
+            return None
+        with store_lock.write():
+            User.clear_all(); Housing.clear_all(); Booking.clear_all(); Review.clear_all()
+            # Части уже разобраны целиком, поэтому в create_many уходят целыми: индексы
+            # строятся одним слиянием на часть, а не вставкой по строке
+            loader = _BatchLoader(progress=progress, name="manager.load_sharded")
+            for kind, rows in parts:
+                loader.extend(kind, rows)
+            loader.flush()
+        metrics.log("loaded", f"Данные успешно загружены из {directory}", path=directory)
+        return loader.counters
+
+    @staticmethod
+    def open_storage(filename: str, cache_size: int = 100_000):
+        """
+        Переключает классы на хранилище SQLite в файле filename (см. storage.SqliteBackend):
+        в памяти остается кеш на cache_size объектов каждого класса. Если база пуста, в нее
+        переносится текущее состояние, иначе оно заменяется содержимым базы.
+        """
+        try:
+            storage.use(storage.SqliteBackend(filename, cache_size))
+        except sqlite3.DatabaseError:
+            metrics.log("corrupted", f"Ошибка чтения файла {filename}. Возможно, он поврежден.", ok=False, path=filename)
+            return
+        metrics.log("storage_opened", f"Хранилище {filename} подключено, размер кеша: {cache_size}", path=filename, cache_size=cache_size)
+
+    @staticmethod
+    def open_columnar_storage(cache_size: int = 10_000):
+        """
+        Переключает классы на компактное колоночное хранилище в памяти (см. columns.ColumnarBackend):
+        текущее состояние переносится в массивы, а объектами остается только кеш на cache_size
+        объектов каждого класса. Методы классов работают как прежде; close_storage возвращает
+        объекты в память.
+        """
+        storage.use(columns.ColumnarBackend(cache_size))
+        metrics.log("storage_opened", f"Колоночное хранилище подключено, размер кеша: {cache_size}", cache_size=cache_size)
+
+    @staticmethod
+    def close_storage():
+        """Загружает все объекты в память и возвращает классы к хранилищу по умолчанию."""
+        if isinstance(storage.current(), storage.DictBackend):
+            return
+        storage.use(storage.DictBackend())
+        metrics.log("storage_closed", "Хранилище отключено, объекты загружены в память")
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """Статистика кеша подключенного хранилища: {класс: {size, capacity, hits, misses, evictions, hit_rate}}."""
+        return storage.current().stats()
+
+    @staticmethod
+    def open_journal(directory: str, fsync: bool = False):
+        """
+        Восстанавливает состояние из журнала в каталоге directory (последняя контрольная
+        точка + хвост лога) и начинает дописывать в него каждое изменение объектов.
+        """
+        Manager.close_journal()
+        Manager._journal = Journal(directory, fsync)
+        metrics.log("journal_opened", f"Журнал {directory} открыт, восстановлено операций: {Manager._journal.records_since_checkpoint}", path=directory, records=Manager._journal.records_since_checkpoint)
+
+    @staticmethod
+    def checkpoint():
+        """Сворачивает журнал в новую контрольную точку."""
+        if Manager._journal is None:
+            metrics.log("journal_not_open", "Журнал не открыт. Контрольная точка не создана.", ok=False)
+            return
+        Manager._journal.checkpoint()
+        metrics.log("checkpoint", "Контрольная точка создана")
+
+    @staticmethod
+    def close_journal():
+        """Отключает журнал изменений, если он был открыт."""
+        if Manager._journal is not None:
+            Manager._journal.close()
+            Manager._journal = None
@@ -0,0 +1,227 @@
+# Необязательные метрики: счетчики, гистограммы задержек и скорость обработки строк
+# для CRUD-операций классов и фаз загрузки/сохранения Manager, а также переключатель
+# сообщений Manager с print на структурированные события
+import bisect
+import functools
+import json
+import sys
+import threading
+import time
+from classes import User, Housing, Booking, Review
+
+# Верхние границы корзин гистограммы задержек, в секундах (последняя корзина — «больше 10 с»)
+BOUNDS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)
+INSTRUMENTED = {User: 'users', Housing: 'housings', Booking: 'bookings', Review: 'reviews'}
+METHODS = ('create', 'create_many', 'get', 'update', 'delete')
+
+enabled = False
+_stats = {}
+_lock = threading.Lock()
+_originals = []  # [(класс, имя метода, исходный атрибут)] на время включенных метрик
+_sink = None  # Получатель структурированных событий вместо print (см. set_sink)
+
+
+class _Stat:
+    """Накопленная статистика одной операции или фазы."""
+    __slots__ = ('count', 'errors', 'total', 'min', 'max', 'rows', 'histogram')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(BOUNDS) + 1)
+
+    def add(self, seconds: float, rows: int = 0, error: bool = False):
+        with _lock:
+            self.count += 1
+            self.errors += error
+            self.total += seconds
+            self.rows += rows
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+            self.histogram[bisect.bisect_left(BOUNDS, seconds)] += 1
+
+    def as_dict(self) -> dict:
+        data = {'count': self.count, 'errors': self.errors, 'total_s': self.total,
+                'mean_s': self.total / self.count if self.count else None,
+                'min_s': self.min if self.count else None, 'max_s': self.max,
+                'histogram': {f"<={bound:g}s": n for bound, n in zip(BOUNDS, self.histogram)}}
+        data['histogram'][f">{BOUNDS[-1]:g}s"] = self.histogram[-1]
+        if self.rows:
+            data['rows'] = self.rows
+            data['rows_per_s'] = self.rows / self.total if self.total else None
+        return data
+
+
+def _stat(name: str) -> _Stat:
+    stat = _stats.get(name)
+    if stat is None:
+        with _lock:
+            stat = _stats.setdefault(name, _Stat())
+    return stat
+
+
+def _timed(func, name: str):
+    """Обертка метода, замеряющая каждый вызов (для create_many — и число созданных строк)."""
+    stat = _stat(name)
+    batch = name.endswith('.create_many')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            stat.add(time.perf_counter() - start, error=True)
+            raise
+        stat.add(time.perf_counter() - start, len(result) if batch else 0)
+        return result
+    return wrapper
+
+
+def enable():
+    """
+    Включает метрики: CRUD-методы классов подменяются замеряющими обертками, фазы
+    Manager начинают записывать время. Пока метрики выключены, методы классов остаются
+    исходными, а фазы Manager стоят одну проверку флага, поэтому накладных расходов нет.
+    Вложенные вызовы (get внутри create, каскадные delete) учитываются отдельно и
+    входят во время внешней операции.
+    """
+    global enabled
+    if enabled:
+        return
+    for cls, kind in INSTRUMENTED.items():
+        for method in METHODS:
+            original = cls.__dict__[method]
+            _originals.append((cls, method, original))
+            if isinstance(original, classmethod):
+                setattr(cls, method, classmethod(_timed(original.__func__, f"{kind}.{method}")))
+            else:
+                setattr(cls, method, _timed(original, f"{kind}.{method}"))
+    enabled = True
+
+
+def disable():
+    """Выключает метрики и возвращает исходные методы классов; накопленные данные сохраняются."""
+    global enabled
+    while _originals:
+        cls, method, original = _originals.pop()
+        setattr(cls, method, original)
+    enabled = False
+
+
+def reset():
+    """
+    Обнуляет накопленные метрики. Объекты статистики обнуляются на месте, а не удаляются:
+    обертки методов и замеряемые итераторы держат ссылки на них с момента enable().
+    """
+    with _lock:
+        for stat in _stats.values():
+            stat.clear()
+
+
+class _Phase:
+    """Замер одной фазы Manager; после блока в rows можно записать число обработанных строк."""
+    __slots__ = ('name', 'rows', '_start')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _stat(self.name).add(time.perf_counter() - self._start, self.rows, exc_type is not None)
+
+
+class _NoPhase:
+    __slots__ = ('rows',)
+
+    def __init__(self):
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+def phase(name: str):
+    """Контекстный менеджер замера фазы name (при выключенных метриках ничего не делает)."""
+    return _Phase(name) if enabled else _NoPhase()
+
+
+def timed_iter(iterable, name: str):
+    """
+    Итератор, время получения каждого элемента которого учитывается как фаза name
+    (например, разбор записей потоковым парсером). При выключенных метриках возвращает iterable.
+    """
+    if not enabled:
+        return iterable
+    return _timed_iter(iter(iterable), _stat(name))
+
+
+def _timed_iter(it, stat: _Stat):
+    spent, rows = 0.0, 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                spent += time.perf_counter() - start
+                return
+            spent += time.perf_counter() - start
+            rows += 1
+            yield item
+    finally:
+        stat.add(spent, rows)
+
+
+def snapshot() -> dict:
+    """Возвращает накопленные метрики: {имя: {count, errors, total_s, mean_s, ..., histogram}}."""
+    with _lock:
+        stats = list(_stats.items())
+    return {name: stat.as_dict() for name, stat in sorted(stats) if stat.count}
+
+
+def dump_json(filename: str):
+    """Сохраняет накопленные метрики в файл JSON."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=4)
+
+
+def set_sink(sink):
+    """
+    Переключает сообщения Manager на структурированные события: sink(event) получает
+    словарь {'time', 'event', 'ok', 'message', ...поля}. None возвращает вывод через print.
+    """
+    global _sink
+    _sink = sink
+
+
+def json_lines(stream=None):
+    """Получатель событий для set_sink, который пишет их строками JSON (по умолчанию в stderr)."""
+    def sink(event: dict):
+        out = stream or sys.stderr
+        out.write(json.dumps(event, ensure_ascii=False) + "\n")
+    return sink
+
+
+def log(event: str, message: str, ok: bool = True, **fields):
+    """Сообщение Manager: строка с ✅/⚠️ через print или событие для получателя из set_sink."""
+    if _sink is None:
+        print(f"{'✅' if ok else '⚠️'} {message}")
+    else:
+        _sink({'time': time.time(), 'event': event, 'ok': ok, 'message': message, **fields})
@@ -0,0 +1,61 @@
+# Преобразование объектов в словари-записи формата JSON и обратно в аргументы create
+from classes import Address, User, Housing, Booking, Review
+from classes.paging import paged_source
+
+ENTITIES = {'users': User, 'housings': Housing, 'bookings': Booking, 'reviews': Review}
+KINDS = {cls: kind for kind, cls in ENTITIES.items()}
+ID_FIELDS = {'users': 'user_id', 'housings': 'housing_id', 'bookings': 'booking_id', 'reviews': 'review_id'}
+
+
+def materialize_all():
+    """Догружает отложенные объекты всех классов (нужно перед полным обходом хранилищ)."""
+    for cls in ENTITIES.values():
+        cls._materialize()
+
+
+def recount_ratings():
+    """
+    Пересчитывает гистограммы оценок всего жилья по хранилищу отзывов. В постраничном
+    режиме гистограммы не ведутся: оценки считает источник отзывов (см. Housing.rating_count).
+    """
+    if paged_source(Review) is not None:
+        return
+    for house in Housing._instances.values():
+        house._ratings = [0] * 5
+    for review in Review._instances.values():
+        review.housing._ratings[review.rating - 1] += 1
+
+
+def to_record(obj) -> dict:
+    """Возвращает запись объекта в том виде, в котором она хранится в JSON-файле."""
+    if isinstance(obj, User):
+        return {'user_id': obj.user_id, 'name': obj.name, 'contact_info': obj.contact_info}
+    if isinstance(obj, Housing):
+        loc = obj.location
+        return {'housing_id': obj.housing_id,
+                'location': {'city': loc.city, 'street': loc.street, 'building_number': loc.building_number, 'postal_code': loc.postal_code},
+                'price_per_night': obj.price_per_night, 'description': obj.description}
+    if isinstance(obj, Booking):
+        return {'booking_id': obj.booking_id, 'user_id': obj.user_id, 'housing_id': obj.housing_id,
+                'start_date': obj.start_date, 'end_date': obj.end_date}
+    if isinstance(obj, Review):
+        return {'review_id': obj.review_id, 'user_id': obj.user_id, 'housing_id': obj.housing_id,
+                'rating': obj.rating, 'comment': obj.comment}
+    raise TypeError(f"Неизвестный тип объекта: {type(obj).__name__}")
+
+
+def to_kwargs(kind: str, rec: dict, lookup=None):
+    """
+    Превращает запись в аргументы create (запись изменяется на месте): location — в Address,
+    user_id/housing_id — в объекты, найденные через lookup(класс, ID) (по умолчанию get класса).
+    Возвращает None, если ссылка указывает на несуществующий объект.
+    """
+    if kind == 'housings':
+        rec['location'] = Address(**rec['location'])
+    elif kind in ('bookings', 'reviews'):
+        lookup = lookup or (lambda cls, item_id: cls.get(item_id))
+        rec['user'] = lookup(User, rec.pop('user_id'))
+        rec['housing'] = lookup(Housing, rec.pop('housing_id'))
+        if not (rec['user'] and rec['housing']):
+            return None
+    return rec
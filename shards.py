@@ -0,0 +1,195 @@
+# Шардированное хранение: каждая часть хранилища — в своем JSON-файле, файлы пишутся
+# и разбираются параллельно в пуле процессов
+#
+# Каталог содержит manifest.json со списком частей и файлы <kind>.<поколение>.<номер>.json,
+# каждый — компактный JSON-массив записей в формате records.to_record. Новое сохранение
+# пишет файлы следующего поколения и только потом подменяет манифест, поэтому сбой
+# посреди сохранения оставляет предыдущее состояние читаемым.
+import json
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from classes import Address, AddressDataError, User, UserDataError, Housing, HousingDataError, Booking, BookingLogicError, Review
+from classes.locking import store_lock
+from records import ENTITIES, ID_FIELDS, to_record, materialize_all
+import atomic
+
+MANIFEST = "manifest.json"
+VERSION = 1
+_PART = re.compile(r"^(users|housings|bookings|reviews)\.(\d+)\.(\d+)\.json$")
+
+# Списки объектов, которые сохраняются в данный момент. Дочерние процессы получают
+# их при fork и сериализуют свою часть, не копируя объекты через каналы.
+_saving = {}
+
+# Ошибки проверки записи в части; InvalidRatingError — подкласс ValueError
+_INVALID = (UserDataError, HousingDataError, AddressDataError, BookingLogicError, ValueError, TypeError, KeyError)
+
+# Заглушки ссылок: конструкторы бронирования и отзыва проверяют запись без связанных объектов
+_USER = User(1, "-", "-")
+_HOUSING = Housing(1, Address("-", "-", "-"), 1, "")
+
+
+class ShardError(Exception):
+    """Собственное исключение для поврежденного или неполного каталога частей."""
+    pass
+
+
+def _fork_context():
+    """Контекст fork, если платформа его поддерживает (иначе сохранение идет в одном процессе)."""
+    try:
+        return multiprocessing.get_context("fork")
+    except ValueError:
+        return None
+
+
+def _read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != VERSION:
+        raise ShardError(f"Каталог {directory} не содержит частей версии {VERSION}.")
+    return manifest
+
+
+def _write_part(kind: str, lo: int, hi: int, path: str) -> int:
+    objs = _saving[kind][lo:hi]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([to_record(obj) for obj in objs], f, ensure_ascii=False, separators=(",", ":"))
+    return len(objs)
+
+
+def save_sharded(directory: str, shards: int = None, workers: int = None):
+    """
+    Сохраняет каждое хранилище в shards частей (по умолчанию — по числу ядер) и пишет их
+    параллельно в workers процессах (по умолчанию — по числу ядер; при одном процессе пул
+    не создается). Возвращает манифест.
+    """
+    shards = shards or os.cpu_count() or 1
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+    try:
+        generation = _read_manifest(directory)["generation"] + 1
+    except (FileNotFoundError, ShardError, ValueError, KeyError):
+        generation = 1
+
+    with store_lock.read_after(materialize_all):
+        tasks = []
+        for kind, cls in ENTITIES.items():
+            objs = _saving[kind] = list(cls.get_all())  # Части берут срезы, а процессы получают список при fork
+            step = max(-(-len(objs) // shards), 1)
+            for i, lo in enumerate(range(0, len(objs), step)):
+                tasks.append((kind, lo, lo + step, os.path.join(directory, f"{kind}.{generation}.{i}.json")))
+        try:
+            context = _fork_context()
+            if context is None or workers == 1 or len(tasks) < 2:
+                counts = [_write_part(*task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                    counts = list(pool.map(_write_part, *zip(*tasks)))
+        finally:
+            _saving.clear()
+
+    manifest = {"version": VERSION, "generation": generation, "parts": {kind: [] for kind in ENTITIES}}
+    for (kind, _, _, path), count in zip(tasks, counts):
+        manifest["parts"][kind].append({"file": os.path.basename(path), "count": count})
+    fd, tmp = atomic.temp_file(os.path.join(directory, MANIFEST))
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+        atomic.replace(tmp, os.path.join(directory, MANIFEST))
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+    # Файлы прошлых поколений больше не нужны
+    for name in os.listdir(directory):
+        m = _PART.match(name)
+        if m and int(m.group(2)) != generation:
+            os.remove(os.path.join(directory, name))
+    return manifest
+
+
+def _check_refs(row: dict):
+    if not isinstance(row.get("user_id"), int) or not isinstance(row.get("housing_id"), int):
+        raise ValueError("Ссылки user_id и housing_id должны быть целыми числами.")
+
+
+def _validate(kind: str, row: dict):
+    """
+    Проверяет запись правилами конструктора класса. Ссылки бронирований и отзывов
+    подменяются заглушками: на какие объекты они указывают, проверяет _check_merge.
+    Для бронирования возвращает период (start, end).
+    """
+    if kind == "users":
+        User(**row)
+    elif kind == "housings":
+        Housing(**dict(row, location=Address(**row["location"])))
+    elif kind == "bookings":
+        _check_refs(row)
+        return Booking(row["booking_id"], _USER, _HOUSING, row["start_date"], row["end_date"])._span
+    else:
+        _check_refs(row)
+        Review(row["review_id"], _USER, _HOUSING, row["rating"], row["comment"])
+
+
+def _read_part(kind: str, path: str, count: int):
+    """Разбирает и проверяет одну часть. Возвращает (записи, периоды бронирований или None)."""
+    with open(path, encoding="utf-8") as f:
+        rows = json.load(f)
+    if not isinstance(rows, list) or len(rows) != count:
+        raise ShardError(f"В файле {path} {len(rows) if isinstance(rows, list) else 'нет'} записей вместо {count}.")
+    spans = []
+    for n, row in enumerate(rows, 1):
+        try:
+            spans.append(_validate(kind, row))
+        except _INVALID as e:
+            # Исключения классов не должны выходить из загрузки: она сообщает о поврежденном каталоге
+            raise ShardError(f"Запись {n} файла {path} некорректна: {e}") from None
+    return rows, spans if kind == "bookings" else None
+
+
+def _check_merge(parts: list):
+    """
+    Проверяет части вместе, до изменения хранилищ: ID не повторяются между частями,
+    а периоды бронирований, которые будут загружены (их пользователь и жилье есть в частях),
+    не пересекаются. Нарушение — ShardError.
+    """
+    ids = {kind: set() for kind in ENTITIES}
+    calendar = {}  # {housing_id: [(start, end, booking_id), ...]}
+    for kind, rows, spans in parts:
+        seen, field = ids[kind], ID_FIELDS[kind]
+        for row in rows:
+            if row[field] in seen:
+                raise ShardError(f"Запись раздела {kind} с ID {row[field]} встречается в частях несколько раз.")
+            seen.add(row[field])
+        if spans is not None:
+            for row, (start, end) in zip(rows, spans):
+                if row["user_id"] in ids["users"] and row["housing_id"] in ids["housings"]:
+                    calendar.setdefault(row["housing_id"], []).append((start, end, row["booking_id"]))
+    for housing_id, periods in calendar.items():
+        periods.sort()
+        for prev, cur in zip(periods, periods[1:]):
+            if prev[1] > cur[0]:
+                raise ShardError(f"Бронирования {prev[2]} и {cur[2]} жилья {housing_id} пересекаются.")
+
+
+def read_sharded(directory: str, workers: int = None):
+    """
+    Разбирает и проверяет все части каталога параллельно в workers процессах.
+    Возвращает список пар (kind, записи части) в порядке слияния: пользователи и жилье
+    раньше бронирований и отзывов. Некорректная запись в любой части, повтор ID или
+    пересечение бронирований между частями прерывают чтение целиком (ShardError).
+    """
+    workers = workers or os.cpu_count() or 1
+    manifest = _read_manifest(directory)
+    tasks = [(kind, os.path.join(directory, part["file"]), part["count"])
+             for kind in ENTITIES for part in manifest["parts"].get(kind, [])]
+    if workers == 1 or len(tasks) < 2:
+        results = [_read_part(kind, path, count) for kind, path, count in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_read_part, *zip(*tasks)))
+    parts = [(kind, rows, spans) for (kind, _, _), (rows, spans) in zip(tasks, results)]
+    _check_merge(parts)
+    return [(kind, rows) for kind, rows, _ in parts]
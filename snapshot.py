@@ -0,0 +1,250 @@
+# Бинарный снимок хранилища и его отложенная загрузка через mmap
+#
+# Формат файла (little-endian):
+#   заголовок   — магия, версия, число записей и смещения четырех разделов и таблицы строк;
+#   разделы     — записи фиксированной ширины, отсортированные по ID (users, housings, bookings, reviews);
+#   строки      — общая таблица строк UTF-8; в записях строка хранится парой (смещение, длина).
+import mmap
+import os
+import struct
+from datetime import date
+from classes import Address, User, Housing, Booking, Review
+from classes.locking import store_lock
+from classes.paging import paged_source
+from records import materialize_all
+import atomic
+
+MAGIC = b"LAB1SNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sI4Q4QQ")
+NO_STRING = 0xFFFFFFFF  # Длина, обозначающая отсутствующую строку (None)
+
+USER = struct.Struct("<qQIQI")              # id, name, contact_info
+HOUSING = struct.Struct("<qdqQIQIQIQI")     # id, price, postal_code (0 — нет), city, street, building_number, description
+BOOKING = struct.Struct("<qqqii")           # id, user_id, housing_id, start, end (порядковые номера дней)
+REVIEW = struct.Struct("<qqqbQI")           # id, user_id, housing_id, rating, comment
+RECORDS = (USER, HOUSING, BOOKING, REVIEW)  # Форматы записей разделов в порядке заголовка
+
+
+class SnapshotError(Exception):
+    """Собственное исключение для поврежденных или несовместимых файлов снимка."""
+    pass
+
+
+class _StringTable:
+    """Накопитель строк для записи: одинаковые строки хранятся один раз."""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._refs = {}
+
+    def ref(self, value):
+        if value is None:
+            return 0, NO_STRING
+        found = self._refs.get(value)
+        if found is None:
+            raw = value.encode("utf-8")
+            found = self._refs[value] = (len(self._data), len(raw))
+            self._data += raw
+        return found
+
+    def bytes(self):
+        return self._data
+
+
+def save_snapshot(filename: str):
+    """
+    Сохраняет все хранилища в бинарный снимок. Файл пишется во временный и атомарно
+    подменяет старый, поэтому уже открытый через mmap снимок остается читаемым.
+    """
+    with store_lock.read_after(materialize_all):
+        strings = _StringTable()
+        counts, offsets = [], []
+        fd, tmp = atomic.temp_file(filename)
+        try:
+            with open(fd, "wb") as f:
+                f.write(bytes(HEADER.size))
+
+                def section(entities, pack):
+                    counts.append(len(entities))
+                    offsets.append(f.tell())
+                    for entity in sorted(entities, key=lambda e: e[0]):
+                        f.write(pack(*entity[1]))
+
+                section([(u.user_id, (u.user_id, *strings.ref(u.name), *strings.ref(u.contact_info)))
+                         for u in User.get_all()], USER.pack)
+                section([(h.housing_id, (h.housing_id, h.price_per_night, h.location.postal_code or 0,
+                                         *strings.ref(h.location.city), *strings.ref(h.location.street),
+                                         *strings.ref(h.location.building_number), *strings.ref(h.description)))
+                         for h in Housing.get_all()], HOUSING.pack)
+                section([(b.booking_id, (b.booking_id, b.user_id, b.housing_id) + b._span)
+                         for b in Booking.get_all()], BOOKING.pack)
+                section([(r.review_id, (r.review_id, r.user_id, r.housing_id, r.rating, *strings.ref(r.comment)))
+                         for r in Review.get_all()], REVIEW.pack)
+
+                strings_offset = f.tell()
+                f.write(strings.bytes())
+                f.seek(0)
+                f.write(HEADER.pack(MAGIC, VERSION, *counts, *offsets, strings_offset))
+            atomic.replace(tmp, filename)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+class _LazySection:
+    """
+    Отложенный источник объектов одного класса поверх раздела снимка.
+    Объект строится при первом обращении к нему через get (бинарный поиск по ID)
+    или при полной догрузке (load_all), которую вызывают get_all и операции над всем хранилищем.
+    """
+    paged = False  # Точечные запросы не поддерживаются: индексам нужны все объекты (см. classes/paging.py)
+
+    def __init__(self, snapshot, entity, record: struct.Struct, offset: int, count: int, args):
+        self._snapshot = snapshot
+        self._entity = entity
+        self._record = record
+        self._offset = offset
+        self._count = count
+        self._args = args
+        self._consumed = bytearray(count)  # 1 — запись уже превращена в объект (или удалена после этого)
+
+    def _id_at(self, i: int) -> int:
+        return struct.unpack_from("<q", self._snapshot.mm, self._offset + i * self._record.size)[0]
+
+    def _find(self, item_id: int) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id_at(mid) < item_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self._count and self._id_at(lo) == item_id else -1
+
+    def _materialize_row(self, i: int):
+        self._consumed[i] = 1
+        row = self._record.unpack_from(self._snapshot.mm, self._offset + i * self._record.size)
+        obj = self._entity(**self._args(self._snapshot, row))
+        self._entity._register(obj)
+        return obj
+
+    def load(self, item_id: int):
+        """Создает объект с указанным ID из снимка; None, если его нет или он уже создавался."""
+        i = self._find(item_id)
+        if i < 0 or self._consumed[i]:
+            return None
+        return self._materialize_row(i)
+
+    def load_all(self):
+        """Создает все оставшиеся объекты раздела и отключает источник от класса."""
+        for i in range(self._count):
+            if not self._consumed[i]:
+                self._materialize_row(i)
+        self._entity._lazy = None
+        self._snapshot.release(self)
+
+
+class _Snapshot:
+    """Открытый через mmap файл снимка; закрывается, когда все разделы догружены."""
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:  # Пустой файл mmap не отображает
+                raise SnapshotError(f"Файл {filename} не является снимком.")
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *rest = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mm.close()
+            raise SnapshotError(f"Файл {filename} не является снимком версии {VERSION}.")
+        self.counts, self.offsets, self.strings_offset = rest[:4], rest[4:8], rest[8]
+        # Разделы проверяются до подключения: обрезанный файл иначе обнаружился бы только
+        # при построении первого объекта, когда прежнее состояние уже очищено
+        for offset, count, record in zip(self.offsets, self.counts, RECORDS):
+            if not HEADER.size <= offset or offset + count * record.size > self.strings_offset:
+                self.mm.close()
+                raise SnapshotError(f"Файл {filename} поврежден: раздел выходит за свои границы.")
+        if self.strings_offset > len(self.mm):
+            self.mm.close()
+            raise SnapshotError(f"Файл {filename} поврежден или обрезан.")
+        self._sections = set()
+
+    def string(self, offset: int, length: int):
+        if length == NO_STRING:
+            return None
+        start = self.strings_offset + offset
+        return self.mm[start:start + length].decode("utf-8")
+
+    def attach(self, index: int, entity, record: struct.Struct, args):
+        """Подключает раздел снимка к классу как отложенный источник (пустые разделы пропускаются)."""
+        if self.counts[index]:
+            section = _LazySection(self, entity, record, self.offsets[index], self.counts[index], args)
+            self._sections.add(section)
+            entity._lazy = section
+
+    def release(self, section):
+        self._sections.discard(section)
+        if not self._sections:
+            self.mm.close()
+
+
+def _user_args(snap: _Snapshot, row) -> dict:
+    return {'user_id': row[0], 'name': snap.string(row[1], row[2]), 'contact_info': snap.string(row[3], row[4])}
+
+
+def _housing_args(snap: _Snapshot, row) -> dict:
+    location = Address(snap.string(row[3], row[4]), snap.string(row[5], row[6]),
+                       snap.string(row[7], row[8]), row[2] or None)
+    return {'housing_id': row[0], 'location': location, 'price_per_night': row[1],
+            'description': snap.string(row[9], row[10])}
+
+
+def _booking_args(snap: _Snapshot, row) -> dict:
+    booking_id, user_id, housing_id, start, end = row
+    return {'booking_id': booking_id, 'user': User.get(user_id), 'housing': Housing.get(housing_id),
+            'start_date': date.fromordinal(start), 'end_date': date.fromordinal(end)}
+
+
+def _review_args(snap: _Snapshot, row) -> dict:
+    return {'review_id': row[0], 'user': User.get(row[1]), 'housing': Housing.get(row[2]),
+            'rating': row[3], 'comment': snap.string(row[4], row[5])}
+
+
+# Разделы снимка в порядке заголовка: класс, формат записи и аргументы конструктора по записи
+SECTIONS = ((User, USER, _user_args), (Housing, HOUSING, _housing_args),
+            (Booking, BOOKING, _booking_args), (Review, REVIEW, _review_args))
+
+
+def _copy_to_source(snap: _Snapshot, batch_size: int = 10000):
+    """
+    Постраничный режим (см. storage.py): объекты класса живут во внешнем хранилище, а не
+    в _instances, поэтому раздел снимка нельзя подключить как отложенный источник — его
+    записи никогда не попали бы в хранилище. Записи передаются в create_many пачками.
+    """
+    for index, (entity, record, args) in enumerate(SECTIONS):
+        offset, count = snap.offsets[index], snap.counts[index]
+        for lo in range(0, count, batch_size):
+            entity.create_many([args(snap, record.unpack_from(snap.mm, offset + i * record.size))
+                                for i in range(lo, min(lo + batch_size, count))])
+
+
+def load_snapshot(filename: str):
+    """
+    Подключает снимок к классам без создания объектов: заголовок читается сразу,
+    а объекты строятся при обращении через get/get_all и другие методы классов.
+    Время открытия не зависит от размера данных.
+    В постраничном режиме записи снимка сразу переносятся во внешнее хранилище.
+    """
+    with store_lock.write():
+        snap = _Snapshot(filename)
+        User.clear_all(); Housing.clear_all(); Booking.clear_all(); Review.clear_all()
+        if paged_source(User) is not None:
+            try:
+                _copy_to_source(snap)
+            finally:
+                snap.mm.close()
+            return
+        for index, (entity, record, args) in enumerate(SECTIONS):
+            snap.attach(index, entity, record, args)
+        if not snap._sections:
+            snap.mm.close()
@@ -0,0 +1,528 @@
+# Подключаемые хранилища объектов классов: словари в памяти (по умолчанию), база SQLite
+# на диске или колонки в памяти (см. columns.py); из двух последних объекты читаются
+# по запросу через ограниченный LRU-кеш
+import json
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from classes import events
+from classes.locking import store_lock
+from records import ENTITIES, KINDS, ID_FIELDS, to_record, to_kwargs, materialize_all, recount_ratings
+
+SCHEMA_VERSION = 1
+# Столбцы таблиц между id и record: по ним выполняются запросы постраничного режима
+# (с типами: без них SQLite не использует индексы в связанных подзапросах по ID)
+COLUMNS = {'users': (), 'housings': ('city TEXT', 'street TEXT', 'price REAL'),
+           'bookings': ('user_id INTEGER', 'housing_id INTEGER', 'start INTEGER', 'end INTEGER'),
+           'reviews': ('user_id INTEGER', 'housing_id INTEGER', 'rating INTEGER')}
+INDEXES = {'housings': ('city, price', 'street, price', 'price'), 'bookings': ('user_id', 'housing_id, start'),
+           'reviews': ('user_id', 'housing_id, rating')}
+_CHUNK = 500  # Ограничение SQLite на число параметров запроса
+
+
+class LRUCache(OrderedDict):
+    """
+    Словарь с ограниченным числом элементов, который заменяет _instances класса
+    в постраничном режиме. Чтение через get переносит элемент в конец очереди; при
+    переполнении вытесняется элемент, к которому дольше всего не обращались, и для него
+    вызывается on_evict(value). Промахи (обращения к диску) учитывает источник объектов.
+    """
+
+    def __init__(self, capacity: int, on_evict=None):
+        super().__init__()
+        self.capacity = capacity
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        # Чтение идет без блокировки (как и get классов), поэтому элемент может быть вытеснен
+        # другим потоком между поиском и переносом в конец очереди
+        value = dict.get(self, key, default)
+        if value is not default:
+            self.hits += 1
+            try:
+                self.move_to_end(key)
+            except KeyError:
+                pass
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.capacity:
+            _, evicted = self.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'size': len(self), 'capacity': self.capacity, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else None}
+
+
+class DictBackend:
+    """Хранилище по умолчанию: все объекты классов находятся в памяти, в словарях _instances."""
+    name = 'dict'
+
+    def attach(self):
+        materialize_all()  # Догружает объекты отложенного источника (снимка)
+
+    def detach(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class _PagedSection:
+    """
+    Источник объектов одного класса поверх таблицы хранилища постраничного режима
+    (подключается как cls._lazy). Объекты строятся при промахе кеша; объекты, вытесненные
+    из кеша, но еще используемые программой, запоминаются по слабым ссылкам, поэтому у одного
+    ID всегда один объект. Запросы, которые в режиме словарей отвечают по индексам в памяти,
+    выполняет хранилище.
+    """
+    paged = True
+
+    def __init__(self, backend, kind: str):
+        self._backend = backend
+        self._kind = kind
+        self._entity = ENTITIES[kind]
+        self._live = weakref.WeakValueDictionary()
+
+    def _build(self, item_id: int, record, lookup=None):
+        """Объект записи: еще используемый программой или новый (None, если ссылки записи не найдены)."""
+        obj = self._live.get(item_id)
+        if obj is None:
+            kwargs = to_kwargs(self._kind, self._backend.decode(record), lookup)
+            if kwargs is None:
+                return None
+            obj = self._entity(**kwargs)
+        return obj
+
+    def load(self, item_id: int):
+        """Возвращает объект с указанным ID из базы и помещает его в кеш; None, если его нет."""
+        self._entity._instances.misses += 1
+        record = self._backend.fetch(self._kind, item_id)
+        obj = None if record is None else self._build(item_id, record)
+        if obj is not None:
+            self._entity._register(obj)
+        return obj
+
+    def load_many(self, ids: list) -> list:
+        """
+        Возвращает объекты с указанными ID в том же порядке (отсутствующие пропускаются).
+        Объекты, которых нет в кеше, читаются одним запросом на пачку ID и помещаются в кеш.
+        """
+        with store_lock.fill():
+            cache = self._entity._instances
+            found = {}
+            missing = []
+            for item_id in ids:
+                obj = cache.get(item_id)
+                if obj is None:
+                    missing.append(item_id)
+                else:
+                    found[item_id] = obj
+            cache.misses += len(missing)
+            for item_id, record in self._backend.fetch_many(self._kind, missing):
+                obj = self._build(item_id, record)
+                if obj is not None:
+                    self._entity._register(obj)
+                    found[item_id] = obj
+            return [found[item_id] for item_id in ids if item_id in found]
+
+    def objects(self):
+        """Все объекты класса (для get_all): последовательность, читающая таблицу по мере обхода."""
+        return _PagedObjects(self)
+
+    def _batch(self, after: int, size: int) -> tuple:
+        """
+        Объекты следующих size строк таблицы с ID больше after и ID последней прочитанной строки
+        (None, если строк больше нет). Недостающие в кеше объекты, как и объекты, на которые они
+        ссылаются, строятся без помещения в кеш и запоминаются по слабым ссылкам. Кеш не меняется,
+        поэтому хватает блокировки заполнения, совместимой с чтением (get_all вызывают
+        и операции над всем хранилищем, которые идут под блокировкой чтения).
+        """
+        with store_lock.fill():  # Читатели не строят объекты одного ID дважды
+            rows = self._backend.scan_after(self._kind, after, size)
+            cache = self._entity._instances
+            refs = {}  # Сильные ссылки на найденные объекты пользователей и жилья на время пачки
+            result = []
+            for item_id, record in rows:
+                obj = dict.get(cache, item_id)  # Без учета в статистике и порядке вытеснения
+                if obj is None:
+                    obj = self._build(item_id, record, lambda cls, ref_id: self._backend.peek(cls, ref_id, refs))
+                    if obj is None:
+                        continue
+                    self._live[item_id] = obj
+                result.append(obj)
+            return result, rows[-1][0] if rows else None
+
+    def evicted(self, obj):
+        self._entity._unregister(obj)
+        self._live[getattr(obj, ID_FIELDS[self._kind])] = obj
+
+    def ids_by(self, field: str, value: int) -> list:
+        return self._backend.ids_by(self._kind, field, value)
+
+    def existing(self, ids) -> set:
+        return self._backend.existing(self._kind, ids)
+
+    def conflicts(self, housing_id: int, start: int, end: int, exclude: int = None) -> bool:
+        return self._backend.conflicts(housing_id, start, end, exclude)
+
+    def ratings(self, housing_id: int) -> list:
+        return self._backend.ratings(housing_id)
+
+    def search(self, city: str, street: str, min_price, max_price, order_by: str, limit: int) -> list:
+        return self.load_many(self._backend.search(city, street, min_price, max_price, order_by, limit))
+
+    def best_rated(self, city: str, n: int, min_reviews: int) -> list:
+        return self.load_many(self._backend.best_rated(city, n, min_reviews))
+
+    def free_housings(self, start: int, end: int, city: str = None) -> list:
+        return self.load_many(self._backend.free_housings(start, end, city))
+
+    def reset(self):
+        self._live.clear()
+
+
+class _PagedObjects:
+    """
+    Результат get_all в постраничном режиме. Строки таблицы читаются пачками по batch_size
+    по возрастанию ID, поэтому при обходе (сохранение в файл, выгрузка, аналитика) в памяти
+    находится одна пачка объектов, а не вся таблица. len выполняет запрос COUNT.
+    Согласованный обход всех классов требует блокировки хранилищ на все время обхода
+    (как у операций над всем хранилищем); без нее каждая пачка читается отдельно.
+    """
+
+    def __init__(self, section: _PagedSection, batch_size: int = 10_000):
+        self._section = section
+        self._batch_size = batch_size
+
+    def __iter__(self):
+        after = 0  # ID объектов положительны
+        while True:
+            batch, after = self._section._batch(after, self._batch_size)
+            yield from batch
+            if after is None:
+                return
+
+    def __len__(self) -> int:
+        return self._section._backend.count(self._section._kind)
+
+
+class PagedBackend:
+    """
+    Основа хранилищ постраничного режима. При подключении классы получают вместо словарей
+    кеш на cache_size объектов (LRUCache) и источник объектов (_PagedSection), который читает
+    строки таблиц хранилища. Подкласс хранит таблицы и отвечает на запросы источника:
+    decode (запись строки -> словарь to_record), fetch, fetch_many, scan, scan_after, count,
+    ids_by, existing, conflicts, ratings, search, best_rated, free_housings; изменения объектов
+    он получает через _on_change (подписка на события классов).
+    """
+    name = None
+
+    def __init__(self, cache_size: int):
+        self.cache_size = cache_size
+        self._sections = {}
+        self._caches = {}
+        self._paged = False
+
+    def _start_paging(self):
+        """Очищает словари классов и переключает их на кеш и источники хранилища (под блокировкой записи)."""
+        for cls in reversed(list(ENTITIES.values())):
+            cls.clear_all()
+        for kind, cls in ENTITIES.items():
+            self._sections[kind] = _PagedSection(self, kind)
+            self._caches[kind] = LRUCache(self.cache_size, self._sections[kind].evicted)
+        self._page_in()
+        events.subscribe(self._on_change)
+
+    def _page_in(self):
+        self._paged = True
+        for kind, cls in ENTITIES.items():
+            cls._instances = self._caches[kind]
+            cls._lazy = self._sections[kind]
+
+    def _cleared(self, cls):
+        """clear_all отключает источник класса: постраничный режим сохраняется."""
+        if self._paged:
+            section = self._sections[KINDS[cls]]
+            section.reset()
+            cls._lazy = section
+
+    def materialize(self):
+        """Загружает в память все объекты хранилища и возвращает классам обычные словари."""
+        with store_lock.write():
+            if not self._paged:
+                return
+            self._paged = False
+            for kind, cls in ENTITIES.items():
+                cache = self._caches[kind]
+                section = self._sections[kind]
+                cls._instances = {}
+                for item_id, record in self.scan(kind):
+                    obj = dict.get(cache, item_id)
+                    if obj is not None:
+                        cls._instances[item_id] = obj  # Объекты из кеша уже есть в индексах
+                        continue
+                    obj = section._build(item_id, record)
+                    if obj is not None:
+                        cls._register(obj)
+                cls._lazy = None
+                cache.clear()  # Счетчики кеша сохраняются для stats
+                section.reset()
+            recount_ratings()  # В постраничном режиме гистограммы оценок жилья не ведутся
+
+    def peek(self, cls, item_id: int, refs: dict):
+        """
+        Объект класса cls с указанным ID без помещения в кеш (None, если его нет): из кеша,
+        из еще используемых объектов или из хранилища. refs запоминает найденные объекты.
+        """
+        key = (cls, item_id)
+        if key not in refs:
+            kind = KINDS[cls]
+            section = self._sections[kind]
+            obj = dict.get(cls._instances, item_id) or section._live.get(item_id)
+            if obj is None:
+                record = self.fetch(kind, item_id)
+                obj = None if record is None else section._build(item_id, record)
+                if obj is not None:
+                    section._live[item_id] = obj
+            refs[key] = obj
+        return refs[key]
+
+    def stats(self) -> dict:
+        """Статистика кешей: {класс: {size, capacity, hits, misses, evictions, hit_rate}}."""
+        return {kind: cache.stats() for kind, cache in self._caches.items()}
+
+
+class SqliteBackend(PagedBackend):
+    """
+    Хранилище в файле SQLite. При подключении (attach) пустая база заполняется текущим
+    состоянием, а непустая заменяет его. Затем в памяти остается только кеш на cache_size
+    объектов каждого класса: get читает объект из базы при промахе, ссылки бронирований и
+    отзывов на пользователей и жилье разрешаются через тот же кеш, а изменения сразу
+    записываются в базу (фиксируются каждые commit_every изменений и при flush/detach).
+    Поиск жилья, рейтинги, свободное жилье, бронирования и отзывы пользователя или жилья,
+    пересечение периодов и занятые ID вычисляются запросами к базе по индексам. get_all
+    и операции над всем хранилищем (сохранение в файл, аналитика) получают объекты пачками
+    на время обхода, не заполняя ими кеш. Все объекты загружаются в память только при отключении.
+    """
+    name = 'sqlite'
+    decode = staticmethod(json.loads)  # Записи хранятся в столбце record как JSON
+
+    def __init__(self, filename: str, cache_size: int = 100_000, commit_every: int = 10_000):
+        super().__init__(cache_size)
+        self.filename = filename
+        self.commit_every = commit_every
+        self._conn = None
+        self._lock = threading.Lock()  # Соединение используется из разных потоков
+        self._pending = 0
+
+    @staticmethod
+    def _row(kind: str, obj) -> tuple:
+        record = json.dumps(to_record(obj), ensure_ascii=False)
+        if kind == 'housings':
+            return (obj.housing_id, obj.location.city, obj.location.street, obj.price_per_night, record)
+        if kind == 'bookings':
+            return (obj.booking_id, obj.user_id, obj.housing_id, *obj._span, record)
+        if kind == 'reviews':
+            return (obj.review_id, obj.user_id, obj.housing_id, obj.rating, record)
+        return (obj.user_id, record)
+
+    @staticmethod
+    def _insert(kind: str) -> str:
+        return f"INSERT OR REPLACE INTO {kind} VALUES ({', '.join('?' * (len(COLUMNS[kind]) + 2))})"
+
+    @staticmethod
+    def _update(kind: str) -> str:
+        columns = ''.join(f"{column.split()[0]} = ?, " for column in COLUMNS[kind])
+        return f"UPDATE {kind} SET {columns}record = ? WHERE id = ?"
+
+    def _create_schema(self):
+        tables = {name for name, in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if tables and self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            raise sqlite3.DatabaseError(f"База {self.filename} создана в другой версии формата.")
+        for kind in ENTITIES:
+            columns = ''.join(f"{column}, " for column in COLUMNS[kind])
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {kind} (id INTEGER PRIMARY KEY, {columns}record TEXT NOT NULL)")
+        for kind, indexes in INDEXES.items():
+            for columns in indexes:
+                name = f"{kind}_{columns.replace(', ', '_')}"
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {kind} ({columns})")
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def attach(self):
+        with store_lock.write():
+            self._conn = sqlite3.connect(self.filename, check_same_thread=False)
+            try:
+                with self._lock:
+                    self._create_schema()
+                    empty = not any(self._conn.execute(f"SELECT 1 FROM {kind} LIMIT 1").fetchone() for kind in ENTITIES)
+            except sqlite3.DatabaseError:
+                self._conn.close()
+                self._conn = None
+                raise
+            if empty:
+                materialize_all()
+                with self._lock:
+                    for kind, cls in ENTITIES.items():
+                        self._conn.executemany(self._insert(kind), (self._row(kind, obj) for obj in cls.get_all()))
+                    self._conn.commit()
+            self._start_paging()
+
+    def detach(self):
+        """Догружает все объекты в память, фиксирует изменения и закрывает базу."""
+        if self._conn is None:
+            return
+        with store_lock.write():
+            self.materialize()
+            events.unsubscribe(self._on_change)
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def flush(self):
+        """Фиксирует в базе накопленные изменения."""
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def _on_change(self, op: str, obj, changes: dict = None):
+        with self._lock:
+            if op == 'clear':
+                kind = KINDS[obj]
+                self._conn.execute(f"DELETE FROM {kind}")
+                self._cleared(obj)
+            else:
+                kind = KINDS[type(obj)]
+                if op == 'delete':
+                    self._conn.execute(f"DELETE FROM {kind} WHERE id = ?", (getattr(obj, ID_FIELDS[kind]),))
+                elif op == 'update':
+                    # Изменение не создает строку заново: удаленный объект не должен вернуться в базу
+                    row = self._row(kind, obj)
+                    self._conn.execute(self._update(kind), row[1:] + row[:1])
+                else:
+                    self._conn.execute(self._insert(kind), self._row(kind, obj))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def fetch(self, kind: str, item_id: int):
+        with self._lock:
+            row = self._conn.execute(f"SELECT record FROM {kind} WHERE id = ?", (item_id,)).fetchone()
+        return row[0] if row else None
+
+    def fetch_many(self, kind: str, ids: list) -> list:
+        rows = []
+        with self._lock:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i:i + _CHUNK]
+                rows += self._conn.execute(f"SELECT id, record FROM {kind} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        return rows
+
+    def scan(self, kind: str):
+        """Пары (id, запись) всех строк таблицы по возрастанию ID."""
+        with self._lock:
+            return self._conn.execute(f"SELECT id, record FROM {kind} ORDER BY id").fetchall()
+
+    def scan_after(self, kind: str, after: int, limit: int) -> list:
+        """Пары (id, запись) не более чем limit строк с ID больше after по возрастанию ID."""
+        with self._lock:
+            return self._conn.execute(f"SELECT id, record FROM {kind} WHERE id > ? ORDER BY id LIMIT ?",
+                                      (after, limit)).fetchall()
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {kind}").fetchone()[0]
+
+    def ids_by(self, kind: str, field: str, value: int) -> list:
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT id FROM {kind} WHERE {field} = ? ORDER BY id", (value,))]
+
+    def existing(self, kind: str, ids) -> set:
+        ids = list(ids)
+        found = set()
+        with self._lock:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i:i + _CHUNK]
+                query = f"SELECT id FROM {kind} WHERE id IN ({','.join('?' * len(chunk))})"
+                found.update(row[0] for row in self._conn.execute(query, chunk))
+        return found
+
+    def conflicts(self, housing_id: int, start: int, end: int, exclude: int = None) -> bool:
+        # Периоды жилья не пересекаются, поэтому, как и в календаре в памяти, достаточно
+        # проверить последний период, начавшийся раньше end
+        with self._lock:
+            row = self._conn.execute("SELECT end FROM bookings WHERE housing_id = ? AND start < ? AND id IS NOT ? "
+                                     "ORDER BY start DESC LIMIT 1", (housing_id, end, exclude)).fetchone()
+        return row is not None and row[0] > start
+
+    def ratings(self, housing_id: int) -> list:
+        """Гистограмма оценок отзывов жилья: [число оценок 1, ..., число оценок 5]."""
+        counts = [0] * 5
+        with self._lock:
+            for rating, n in self._conn.execute("SELECT rating, COUNT(*) FROM reviews WHERE housing_id = ? GROUP BY rating",
+                                                (housing_id,)):
+                counts[rating - 1] = n
+        return counts
+
+    def search(self, city: str = None, street: str = None, min_price=None, max_price=None,
+               order_by: str = None, limit: int = None) -> list:
+        """ID жилья для Housing.search в том же порядке: по цене (и ID) или по ID."""
+        where, params = [], []
+        for condition, value in (("city = ?", city), ("street = ?", street),
+                                 ("price >= ?", min_price), ("price <= ?", max_price)):
+            if value is not None:
+                where.append(condition)
+                params.append(value)
+        query = "SELECT id FROM housings" + (" WHERE " + " AND ".join(where) if where else "")
+        query += {None: " ORDER BY id", 'price': " ORDER BY price, id", '-price': " ORDER BY price DESC, id DESC"}[order_by]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(max(limit, 0))
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, params)]
+
+    def best_rated(self, city: str, n: int, min_reviews: int) -> list:
+        """ID жилья для Housing.best_rated: по средней оценке, затем по числу отзывов."""
+        if n <= 0:
+            return []
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT h.id FROM housings h JOIN reviews r ON r.housing_id = h.id WHERE h.city = ? "
+                "GROUP BY h.id HAVING COUNT(*) >= ? ORDER BY AVG(r.rating) DESC, COUNT(*) DESC, h.id LIMIT ?",
+                (city, min_reviews, n))]
+
+    def free_housings(self, start: int, end: int, city: str = None) -> list:
+        """ID жилья без бронирований, пересекающих [start, end) (проверка — как в conflicts)."""
+        query = ("SELECT h.id FROM housings h WHERE " + ("h.city = ? AND " if city is not None else "") +
+                 "COALESCE((SELECT b.end FROM bookings b WHERE b.housing_id = h.id AND b.start < ? "
+                 "ORDER BY b.start DESC LIMIT 1), ?) <= ? ORDER BY h.id")
+        params = ((city,) if city is not None else ()) + (end, start, start)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, params)]
+
+_current = DictBackend()
+
+
+def current():
+    """Возвращает подключенное хранилище."""
+    return _current
+
+
+def use(backend):
+    """Переключает классы на хранилище backend; прежнее хранилище догружается в память и отключается."""
+    global _current
+    with store_lock.write():
+        _current.detach()
+        backend.attach()
+        _current = backend
@@ -0,0 +1,144 @@
+# Журнал изменений и контрольные точки на основе бинарного снимка
+import json
+import os
+import re
+from classes import events
+from classes.locking import store_lock
+from records import ENTITIES, KINDS, ID_FIELDS, to_record, to_kwargs, materialize_all
+import snapshot
+
+_FILE = re.compile(r"^(checkpoint|wal)\.(\d+)\.(snap|log)$")
+
+
+class JournalError(Exception):
+    """Собственное исключение для поврежденного журнала."""
+    pass
+
+
+class Journal:
+    """
+    Журнал изменений в каталоге directory:
+      checkpoint.<N>.snap — снимок состояния на момент контрольной точки N (см. snapshot.py);
+      wal.<N>.log         — операции после нее, по одной компактной JSON-строке на операцию.
+    Каждая операция create/update/delete/clear_all дописывается в конец лога, поэтому цена
+    сохранения одного изменения не зависит от объема данных.
+    Запись попадает в лог после изменения в памяти (из обработчика событий), но до возврата
+    из метода класса, под блокировкой записи: журнал отложенный, а не упреждающий. Сбой
+    между изменением и дозаписью теряет операцию, которую вызвавший поток еще не получил,
+    хотя другие потоки могли увидеть ее через get без блокировки. Если дозапись не удалась,
+    исключение получает вызвавший, а изменение в памяти остается. checkpoint() сворачивает лог
+    в новый снимок и начинает следующий лог; при открытии состояние восстанавливается из
+    последнего снимка и хвоста лога.
+    Загрузка бинарного снимка не порождает событий create, поэтому Manager.load_snapshot
+    и AsyncManager после нее сами вызывают checkpoint(). Журнал в новом каталоге начинается
+    с контрольной точки текущего состояния.
+    """
+
+    def __init__(self, directory: str, fsync: bool = False):
+        self._dir = directory
+        self._fsync = fsync
+        self.records_since_checkpoint = 0
+        os.makedirs(directory, exist_ok=True)
+        with store_lock.write():
+            self._gen = self._recover()
+            self._log = open(self._path("wal", self._gen), "ab")
+            events.subscribe(self._append)
+
+    def _path(self, kind: str, gen: int) -> str:
+        ext = "snap" if kind == "checkpoint" else "log"
+        return os.path.join(self._dir, f"{kind}.{gen}.{ext}")
+
+    def _recover(self) -> int:
+        """
+        Загружает последний снимок, проигрывает хвост лога и возвращает номер поколения.
+        В каталоге без журнала текущее состояние не стирается, а сохраняется как контрольная
+        точка 0: журнал продолжает его, а не пустое хранилище.
+        """
+        with store_lock.write():
+            gens = [int(m.group(2)) for m in map(_FILE.match, os.listdir(self._dir)) if m and m.group(1) == "checkpoint"]
+            gen = max(gens, default=0)
+            log_path = self._path("wal", gen)
+            if gens:
+                snapshot.load_snapshot(self._path("checkpoint", gen))
+            elif not os.path.exists(log_path):
+                snapshot.save_snapshot(self._path("checkpoint", gen))
+                return gen
+            else:
+                for cls in ENTITIES.values():  # Журнал без контрольной точки начинался с пустого хранилища
+                    cls.clear_all()
+            if os.path.exists(log_path):
+                self._replay(log_path)
+            return gen
+
+    def _replay(self, log_path: str):
+        good = 0  # Длина корректной части лога
+        with open(log_path, "r+b") as f:
+            for n, line in enumerate(f, 1):  # Лог читается построчно, а не целиком
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("неполная запись")
+                    rec = json.loads(line)
+                except ValueError:
+                    if f.readline():
+                        raise JournalError(f"Запись {n} журнала {log_path} повреждена.")
+                    f.truncate(good)  # Оборванная последняя запись: сбой во время дозаписи
+                    break
+                self._apply(rec)
+                good += len(line)
+                self.records_since_checkpoint += 1
+
+    @staticmethod
+    def _apply(rec: list):
+        op, kind = rec[0], rec[1]
+        cls = ENTITIES[kind]
+        if op == "c":
+            kwargs = to_kwargs(kind, rec[2])
+            if kwargs is not None:
+                cls.create(**kwargs)
+        elif op == "u":
+            obj = cls.get(rec[2])
+            if obj is not None:  # Логи прежних версий могли записать изменение после удаления
+                obj.update(**rec[3])
+        elif op == "d":
+            obj = cls.get(rec[2])
+            if obj is not None:
+                obj.delete()
+        elif op == "x":
+            cls.clear_all()
+
+    def _append(self, op: str, obj, changes: dict = None):
+        if op == "clear":
+            rec = ["x", KINDS[obj]]
+        else:
+            kind = KINDS[type(obj)]
+            if op == "create":
+                rec = ["c", kind, to_record(obj)]
+            elif op == "update":
+                rec = ["u", kind, getattr(obj, ID_FIELDS[kind]), changes]
+            else:
+                rec = ["d", kind, getattr(obj, ID_FIELDS[kind])]
+        self._log.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        self._log.flush()
+        if self._fsync:
+            os.fsync(self._log.fileno())
+        self.records_since_checkpoint += 1
+
+    def checkpoint(self):
+        """Сохраняет текущее состояние в новый снимок и начинает новый лог, удаляя старые файлы."""
+        with store_lock.read_after(materialize_all):
+            gen = self._gen + 1
+            snapshot.save_snapshot(self._path("checkpoint", gen))
+            old_log, self._log = self._log, open(self._path("wal", gen), "ab")
+            old_log.close()
+            for kind in ("checkpoint", "wal"):
+                try:
+                    os.remove(self._path(kind, self._gen))
+                except FileNotFoundError:
+                    pass
+            self._gen = gen
+            self.records_since_checkpoint = 0
+
+    def close(self):
+        """Отключает журнал от классов и закрывает лог."""
+        events.unsubscribe(self._append)
+        self._log.close()
@@ -0,0 +1,62 @@
+# Потоковая запись и чтение XML без построения полного дерева документа
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+_ATTR_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\t": "&#9;"}
+
+class XmlStreamWriter:
+    """
+    Пишет XML-документ в файл по мере обхода данных. Каждая запись сразу уходит в файл,
+    поэтому в памяти не хранится ни дерево, ни строковая копия документа.
+    Отступы (indent) дешевые: это готовые префиксы строк, без повторного разбора.
+    """
+
+    def __init__(self, f, indent: str = "    "):
+        self._f = f
+        self._indent = indent
+        self._newline = "\n" if indent is not None else ""
+        self._stack = []
+
+    def _prefix(self, depth: int) -> str:
+        return self._indent * depth if self._indent else ""
+
+    @staticmethod
+    def _attrs(attrs: dict) -> str:
+        return "".join(f' {k}="{escape(str(v), _ATTR_ENTITIES)}"' for k, v in attrs.items())
+
+    def declaration(self):
+        self._f.write(f'<?xml version="1.0" encoding="utf-8"?>{self._newline}')
+
+    def start(self, tag: str, **attrs):
+        """Открывает элемент-контейнер (например, <data> или <users>)."""
+        self._f.write(f"{self._prefix(len(self._stack))}<{tag}{self._attrs(attrs)}>{self._newline}")
+        self._stack.append(tag)
+
+    def end(self):
+        """Закрывает последний открытый контейнер."""
+        tag = self._stack.pop()
+        self._f.write(f"{self._prefix(len(self._stack))}</{tag}>{self._newline}")
+
+    def element(self, tag: str, text=None, **attrs):
+        """Пишет простой элемент с текстом: <tag attr="...">text</tag>."""
+        body = "" if text is None else escape(str(text))
+        self._f.write(f"{self._prefix(len(self._stack))}<{tag}{self._attrs(attrs)}>{body}</{tag}>{self._newline}")
+
+
+def iter_records(filename: str, record_tags: set):
+    """
+    Разбирает XML через ET.iterparse и отдает пары (тег, элемент) для записей с тегами
+    из record_tags. После обработки запись удаляется из родителя, поэтому память
+    не растет с размером файла. Элемент действителен только до следующей итерации.
+    """
+    parents = []
+    for event, elem in ET.iterparse(filename, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag in record_tags:
+            yield elem.tag, elem
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)